@@ -0,0 +1,58 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import timeit
+
+from benchmarks.payloads import generate
+from swissquote.decode import DECODERS
+
+
+def recorded_payloads(snapshot_dir: str) -> list:
+    payloads = []
+    for path in glob.glob(os.path.join(snapshot_dir, "objects", "*", "*.json.gz")):
+        with gzip.open(path, "rb") as f:
+            payloads.append(f.read())
+
+    return payloads
+
+
+def synthetic_payloads(clients: int, pages: int, rows: int) -> list:
+    data = generate(clients, pages, rows)
+    return [
+        json.dumps(page).encode("utf-8")
+        for client_pages in data["transactions"].values()
+        for page in client_pages
+    ]
+
+
+def run(payloads: list, repeat: int) -> dict:
+    size = sum(len(p) for p in payloads) / 2**20
+    results = {}
+    for name, loads in DECODERS.items():
+        best = min(
+            timeit.repeat(lambda: [loads(p) for p in payloads], number=1, repeat=repeat)
+        )
+        results[name] = {"seconds": best, "mb_per_s": size / best}
+        print(f"{name:>8}: {best * 1000:8.1f} ms  {size / best:8.1f} MB/s")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare JSON decoders")
+    parser.add_argument("--snapshot-dir", help="decode payloads recorded by a run")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.snapshot_dir:
+        payloads = recorded_payloads(args.snapshot_dir)
+    else:
+        payloads = synthetic_payloads(args.clients, args.pages, args.rows)
+
+    print(f"{len(payloads)} payloads, {sum(map(len, payloads)) / 2**20:.1f} MB")
+    run(payloads, args.repeat)
@@ -0,0 +1,220 @@
+import datetime
+import random
+
+CURRENCIES = ["CHF", "EUR", "USD", "GBP", "DKK", "SEK", "NOK"]
+TRANSACTION_CODES = {
+    "BUY": "Purchase",
+    "SELL": "Sale",
+    "DIV": "Dividend",
+    "FEE": "Custody fees",
+    "PAY": "Payment",
+    "INT": "Interest",
+}
+SECURITY_TYPES = ["SHARE", "BOND", "FUND", "ETF", "OPTION"]
+LANGUAGES = ["en", "fr", "de", "it"]
+
+
+def _date(rnd, start=datetime.date(2018, 1, 1), days=2500) -> datetime.date:
+    return start + datetime.timedelta(days=rnd.randrange(days))
+
+
+def _amount(rnd, scale=10000) -> float:
+    return round(rnd.uniform(-scale, scale), 2)
+
+
+def security(securityid) -> dict:
+    # the API returns the same reference data wherever a security shows up
+    rnd = random.Random(securityid)
+    bond = securityid % 5 == 1
+    return {
+        "securityId": securityid,
+        "isin": f"CH{securityid:010d}",
+        "stockExchangeId": rnd.randint(1, 40),
+        "symbol": f"SYM{securityid}",
+        "securityType": "BOND" if bond else rnd.choice(SECURITY_TYPES),
+        "securityGroup": rnd.randint(1, 12),
+        "name": f"Security {securityid}",
+        "maturityDate": _date(rnd).isoformat() if bond else None,
+        "cotationType": rnd.choice(["UNIT", "PERCENT"]),
+        "cotationFactor": 1,
+        "currency": rnd.choice(CURRENCIES),
+        "valorNumber": 1000000 + securityid,
+        "underlyingSecurityId": None,
+        "expirationDate": None,
+        "multiplier": 1,
+        "exerciseType": None,
+    }
+
+
+def transaction(rnd, clientid, operation_date, securityid) -> dict:
+    code = rnd.choice(list(TRANSACTION_CODES))
+    qty = rnd.randint(1, 500) if code in ["BUY", "SELL"] else None
+    value_date = operation_date + datetime.timedelta(days=rnd.choice([0, 1, 2]))
+    return {
+        "accountId": clientid * 10 + rnd.randint(0, 2),
+        "transactionId": rnd.getrandbits(48),
+        "noTransaction": rnd.getrandbits(32),
+        "operationDate": operation_date.isoformat(),
+        "valueDate": value_date.isoformat(),
+        "dateTransaction": f"{operation_date.isoformat()}T{rnd.randint(8, 17):02d}:"
+        f"{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}.000+01:00",
+        "transactionCode": code,
+        "transactionCodeDescription": TRANSACTION_CODES[code],
+        "unitPrice": round(rnd.uniform(1, 900), 4) if qty else None,
+        "netAmount": _amount(rnd),
+        "accountCurrency": rnd.choice(CURRENCIES[:3]),
+        "currencyRate": round(rnd.uniform(0.8, 1.3), 6),
+        "contractNumber": None,
+        "actionType": rnd.choice(["DEBIT", "CREDIT"]),
+        "documents": None,
+        "senderAccount": None,
+        "senderInfo": None,
+        "senderCommunication": None,
+        "orderId": rnd.getrandbits(40) if qty else None,
+        "depositCommission": None,
+        "securityId": securityid if qty or code == "DIV" else None,
+        "qty": qty,
+        "currency": rnd.choice(CURRENCIES),
+        "stockExchangeId": rnd.randint(1, 40) if qty else None,
+        "accruedInterest": None,
+        "cotationType": "UNIT",
+        "cotationFactor": 1,
+        "contractSize": 1,
+        "exchangeFees": round(rnd.uniform(0, 5), 2),
+        "thirdPartyCommission": 0,
+        "thirdPartyFees": 0,
+        "sqbCommission": round(rnd.uniform(0, 30), 2),
+        "amCommission": 0,
+        "fft": 0,
+        "tax": round(rnd.uniform(0, 2), 2),
+        "stockExchangeFees": 0,
+        "vat": 0,
+        "withHoldingTax": None,
+        "supplementaryWithHoldingTax": None,
+        "recoverableTax": None,
+        "fees": round(rnd.uniform(0, 10), 2),
+        "groupOrderId": None,
+        "initialAction": None,
+        "originalQty": qty,
+        "operationTypeCode": code,
+    }
+
+
+def position(rnd, securityid) -> dict:
+    currencies = rnd.sample(CURRENCIES, rnd.randint(1, 2))
+    return {
+        "qty": rnd.randint(1, 5000),
+        "currency": currencies[0],
+        "accountNumber": f"{rnd.randint(100000, 999999)}.00",
+        "type": "SECURITY",
+        "securityId": securityid,
+        "refCurrency": "CHF",
+        "evaluationPrice": round(rnd.uniform(1, 900), 4),
+        "evaluationDate": "2024-01-05T17:30:00.000+01:00",
+        "currentCost": _amount(rnd, 100000),
+        "currentCostInRefCurrency": _amount(rnd, 100000),
+        "securityGroup": rnd.randint(1, 12),
+        "cotationType": "UNIT",
+        "cotationFactor": 1,
+        "averageBuyCosts": {c: round(rnd.uniform(1, 900), 4) for c in currencies},
+        "accruedInterest": None,
+        "accruedInterestInRefCurrency": None,
+        "accruedInterestSecurityCurrency": None,
+        "noContract": None,
+        "amount": None,
+        "startDate": None,
+        "endDate": None,
+        "interest": None,
+        "depositType": None,
+        "counterparty": None,
+    }
+
+
+def buyingpower(rnd, clientid, currency) -> dict:
+    return {
+        "client": clientid,
+        "currency": currency,
+        "buyingPower": _amount(rnd, 500000),
+        "cash": {"amount": _amount(rnd, 100000), "currency": currency},
+        "collateral": {"amount": _amount(rnd, 100000), "currency": currency},
+        "clientMargins": [],
+        "prenotes": [],
+        "fxPnlDetails": [],
+        "accounts": [
+            {"accountNumber": f"{rnd.randint(100000, 999999)}.0{i}", "balance": b}
+            for i, b in enumerate(_amount(rnd) for _ in range(rnd.randint(1, 3)))
+        ],
+    }
+
+
+def staticlists() -> dict:
+    return {
+        "currencies": [{"currency": c, "currencyName": c} for c in CURRENCIES],
+        "stockExchanges": [
+            {"stockExchange": i, "description": f"Exchange {i}", "country": "CH"}
+            for i in range(1, 41)
+        ],
+        "transactionCodes": [
+            {"code": k, "description": v} for k, v in TRANSACTION_CODES.items()
+        ],
+    }
+
+
+def generate(
+    clients=20, pages=5, rows=100, securities=2000, seed=0, heavy=0
+) -> dict:
+    # mirrors what App.fetch returns, newest transactions on the first page;
+    # the last `heavy` clients have ten times as many pages
+    rnd = random.Random(seed)
+    data = {
+        "clients": [],
+        "staticlists": staticlists(),
+        "positions": {},
+        "transactions": {},
+        "buyingpowers": {},
+    }
+    for index, clientid in enumerate(range(100001, 100001 + clients)):
+        page_count = pages * 10 if index >= clients - heavy else pages
+        currency = rnd.choice(CURRENCIES[:3])
+        data["clients"].append(
+            {
+                "clientId": clientid,
+                "contractStart": _date(rnd).isoformat(),
+                "referenceCurrency": currency,
+                "preferredLanguage": rnd.choice(LANGUAGES),
+                "positions": True,
+                "transactions": True,
+                "buyingPower": True,
+            }
+        )
+
+        held = rnd.sample(range(1, securities + 1), min(securities, 30))
+        data["positions"][clientid] = {
+            "positions": [position(rnd, s) for s in held],
+            "securities": [security(s) for s in held],
+        }
+
+        operation_date = datetime.date(2024, 1, 31)
+        client_pages = []
+        for page in range(1, page_count + 1):
+            txs = []
+            for _ in range(rows):
+                operation_date -= datetime.timedelta(days=rnd.choice([0, 0, 1]))
+                txs.append(
+                    transaction(rnd, clientid, operation_date, rnd.choice(held))
+                )
+
+            ids = sorted({tx["securityId"] for tx in txs if tx["securityId"]})
+            client_pages.append(
+                {
+                    "page": page,
+                    "totalNumberOfPages": page_count,
+                    "transactions": txs,
+                    "securities": [security(s) for s in ids],
+                }
+            )
+
+        data["transactions"][clientid] = client_pages
+        data["buyingpowers"][clientid] = buyingpower(rnd, clientid, currency)
+
+    return data
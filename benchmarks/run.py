@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks.payloads import generate
+from benchmarks.stub import StubServer
+from config import settings
+from swissquote import App, PageHistory
+from transformer import Agent, ColumnarAgent
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def timed(func, repeat) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return {"best": min(times), "median": statistics.median(times)}
+
+
+def count_rows(data) -> int:
+    rows = sum(len(p["positions"]) for p in data["positions"].values())
+    for pages in data["transactions"].values():
+        rows += sum(len(page["transactions"]) for page in pages)
+
+    return rows
+
+
+def bench_fetch(data, args) -> dict:
+    results = {}
+    with StubServer(
+        data, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate
+    ) as stub:
+
+        def init_app():
+            return App(
+                token="benchmark",
+                max_retries=settings.REQUEST_MAX_RETRIES,
+                backoff_factor=0,
+                max_workers=settings.REQUEST_MAX_WORKERS,
+                page_workers=settings.REQUEST_MAX_PAGE_WORKERS,
+                base_url=stub.url,
+            )
+
+        for name, fetch in [
+            ("fetch", lambda: init_app().fetch()),
+            ("fetch_async", lambda: asyncio.run(init_app().fetch_async())),
+        ]:
+            stub.requests = 0
+            results[name] = timed(fetch, args.repeat)
+            results[name]["requests"] = stub.requests // args.repeat
+            results[name]["requests_per_s"] = (
+                results[name]["requests"] / results[name]["best"]
+            )
+
+    return results
+
+
+def bench_schedule(data, args) -> dict:
+    # the same fetch without and with the page counts of a previous run, which
+    # matters once a few clients (--heavy) have far more pages than the rest
+    results = {}
+    history = PageHistory()
+    with StubServer(data, latency=args.latency, jitter=args.jitter) as stub:
+
+        def fetch(history):
+            app = App(
+                token="benchmark",
+                max_retries=settings.REQUEST_MAX_RETRIES,
+                backoff_factor=0,
+                max_workers=settings.REQUEST_MAX_WORKERS,
+                page_workers=settings.REQUEST_MAX_PAGE_WORKERS,
+                base_url=stub.url,
+                history=history,
+            )
+            app.clients = app.client.get_managed_clients()
+            app.fetch_clients_transactions()
+
+        fetch(history)
+        for name, make_history in [
+            ("schedule_cold", PageHistory),
+            ("schedule_warm", lambda: history),
+        ]:
+            results[name] = timed(lambda: fetch(make_history()), args.repeat)
+
+    return results
+
+
+def bench_transform(data, args) -> dict:
+    results = {}
+    rows = count_rows(data)
+    for name, agent_cls in [("transform", Agent), ("transform_arrow", ColumnarAgent)]:
+        results[name] = timed(lambda: agent_cls(data).transform(), args.repeat)
+        results[name]["rows_per_s"] = rows / results[name]["best"]
+
+    return results
+
+
+def bench_insert(data, args) -> dict:
+    try:
+        from benchmarks.sqlstub import StubDatabase
+    except ImportError as e:
+        print(f"Skipping insert benchmarks: {e}")
+        return {}
+
+    dfs = Agent(data).transform()
+    rows = sum(len(df) for df in dfs.values())
+
+    def insert():
+        for name, df in dfs.items():
+            table = getattr(settings, f"{name.upper()}_OUTPUT_TABLE")
+            StubDatabase().insert_table(df.copy(), table)
+
+    result = timed(insert, args.repeat)
+    result["rows_per_s"] = rows / result["best"]
+    return {"insert": result}
+
+
+def bench_parquet(data, args) -> dict:
+    from database.parquet import ParquetSink
+
+    dfs = Agent(data).transform()
+    rows = sum(len(df) for df in dfs.values())
+    with tempfile.TemporaryDirectory() as directory:
+        sink = ParquetSink(directory)
+        result = timed(lambda: sink.write(dfs), args.repeat)
+
+    result["rows_per_s"] = rows / result["best"]
+    return {"parquet": result}
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, params, baseline_path) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline['commit']} ({baseline['date']})")
+    changed = [
+        k
+        for k, v in params.items()
+        if k not in ["benchmarks", "compare"] and baseline["params"].get(k) != v
+    ]
+    if changed:
+        print(f"Warning: parameters differ from the baseline: {changed}")
+
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before:
+            change = result["best"] / before["best"] - 1
+            print(
+                f"{name:>16}: {before['best']:8.3f}s -> {result['best']:8.3f}s "
+                f"({change:+.1%})"
+            )
+
+
+BENCHMARKS = {
+    "fetch": bench_fetch,
+    "schedule": bench_schedule,
+    "transform": bench_transform,
+    "insert": bench_insert,
+    "parquet": bench_parquet,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {list(BENCHMARKS)}")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--heavy", type=int, default=0, help="clients with 10x pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="results file, default results/<commit>")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {sorted(unknown)}")
+
+    data = generate(
+        args.clients, args.pages, args.rows, seed=args.seed, heavy=args.heavy
+    )
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        results.update(BENCHMARKS[name](data, args))
+
+    for name, result in results.items():
+        extra = ", ".join(
+            f"{k} {v:,.0f}" for k, v in result.items() if k not in ["best", "median"]
+        )
+        print(
+            f"{name:>16}: best {result['best']:.3f}s, "
+            f"median {result['median']:.3f}s, {extra}"
+        )
+
+    report = {
+        "commit": commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ["output"]},
+        "results": results,
+    }
+    path = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Saved results to {path}")
+    if args.compare:
+        compare(results, report["params"], args.compare)
@@ -0,0 +1,72 @@
+import re
+
+from database.mssql import MSSQLDatabase
+
+
+class StubCursor:
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.fast_executemany = False
+        self.result = None
+
+    def execute(self, sql, *params) -> "StubCursor":
+        self.connection.statements += 1
+        self.connection.executed.append(sql)
+        self.connection.track_temp_tables(sql)
+        self.result = "dbo" if "SCHEMA_NAME()" in sql else 1
+        return self
+
+    def executemany(self, sql, params) -> None:
+        self.connection.statements += 1
+        self.connection.executed.append(sql)
+        self.connection.rows += len(list(params))
+
+    def fetchall(self) -> list:
+        return [[self.result]]
+
+    def close(self) -> None:
+        pass
+
+
+# Stands in for a pyodbc connection to SQL Server: every table exists and
+# statements return immediately, so an insert benchmark measures the client
+# side of insert_table (frame preparation, fast_to_sql row conversion, staging
+# and pooling) without a database. Temp tables live as long as the connection,
+# as they do on the server.
+class StubConnection:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.rows = 0
+        self.executed = []
+        self.temp_tables = set()
+
+    def track_temp_tables(self, sql) -> None:
+        created = re.search(r"\bINTO (#\S+)", sql)
+        if created:
+            if created.group(1) in self.temp_tables:
+                raise RuntimeError(
+                    f"There is already an object named '{created.group(1)}'"
+                )
+
+            self.temp_tables.add(created.group(1))
+
+        dropped = re.search(r"\bDROP TABLE (#\S+)", sql)
+        if dropped:
+            self.temp_tables.discard(dropped.group(1))
+
+    def cursor(self) -> StubCursor:
+        return StubCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class StubDatabase(MSSQLDatabase):
+    def _get_connection(self):
+        return StubConnection()
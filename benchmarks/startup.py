@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.run import RESULTS_DIR, commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = ["fetch", "transform", "load", "full"]
+
+
+def startup(command, repeat) -> dict:
+    # a dry run resolves the settings and imports what the command needs
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "main.py"), "--dry-run", command],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+        )
+        times.append(time.perf_counter() - start)
+
+    return {"best": min(times), "median": statistics.median(times)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the CLI startup per command")
+    parser.add_argument("commands", nargs="*", help=f"any of {COMMANDS}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="default results/startup-<commit>.json")
+    args = parser.parse_args()
+
+    results = {}
+    for command in args.commands or COMMANDS:
+        try:
+            results[command] = startup(command, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"Skipping {command}: {e.stderr.decode().strip().splitlines()[-1]}")
+            continue
+
+        print(
+            f"{command:>10}: best {results[command]['best']:.3f}s, "
+            f"median {results[command]['median']:.3f}s"
+        )
+
+    path = args.output or os.path.join(RESULTS_DIR, f"startup-{commit()}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit(), "results": results}, f, indent=2)
+
+    print(f"Saved results to {path}")
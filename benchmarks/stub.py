@@ -0,0 +1,124 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from swissquote.request import BASE_URL
+
+PREFIX = urlparse(BASE_URL).path
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        stub = self.server.stub
+        url = urlparse(self.path)
+        stub.count()
+        if stub.latency:
+            time.sleep(stub.latency + stub.jitter * stub.random())
+
+        if stub.error_rate and stub.random() < stub.error_rate:
+            return self.respond(503, {"error": "injected"})
+
+        body = stub.route(url.path[len(PREFIX) :], parse_qs(url.query))  # noqa: E203
+        if body is None:
+            return self.respond(404, {"error": "not found"})
+
+        self.respond(200, body)
+
+    def respond(self, status, body) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+# Serves a payload from benchmarks.payloads under the real endpoint paths, with
+# optional per-request latency (plus random jitter) and injected 503 errors.
+class StubServer:
+    ROUTES = [
+        (re.compile(r"^clients$"), "clients"),
+        (re.compile(r"^lists/?$"), "staticlists"),
+        (re.compile(r"^clients/rates$"), "rates"),
+        (re.compile(r"^clients/(\d+)/positions$"), "positions"),
+        (re.compile(r"^clients/(\d+)/transactions$"), "transactions"),
+        (re.compile(r"^clients/(\d+)/buyingPower/\w+$"), "buyingpowers"),
+    ]
+
+    def __init__(self, data, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}{PREFIX}"
+
+    def random(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def route(self, path, query):
+        for pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+
+            if name in ["clients", "staticlists"]:
+                return self.data.get(name)
+
+            if name == "rates":
+                return {"rates": []}
+
+            payload = self.data.get(name, {}).get(int(match.group(1)))
+            if name != "transactions":
+                return payload
+
+            page = int(query.get("page", ["1"])[0])
+            if not payload:
+                return {
+                    "page": 1,
+                    "totalNumberOfPages": 0,
+                    "transactions": [],
+                    "securities": [],
+                }
+
+            return payload[page - 1] if page <= len(payload) else None
+
+        return None
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
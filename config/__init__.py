@@ -1 +1,2 @@
 from .logger import logger
+from .metrics import metrics
@@ -8,3 +8,4 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger()
+logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -0,0 +1,135 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0, "count": 0}
+                self.histograms[key] = hist
+
+            hist["buckets"][bisect.bisect_left(BUCKETS, value)] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            hist["max"] = max(hist.get("max", value), value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def report(self) -> dict:
+        report = {}
+        with self.lock:
+            for kind, series in [
+                ("counters", self.counters),
+                ("gauges", self.gauges),
+                ("histograms", self.histograms),
+            ]:
+                for (name, labels), value in sorted(series.items()):
+                    if kind == "histograms":
+                        value = {
+                            "count": value["count"],
+                            "sum": round(value["sum"], 6),
+                            "mean": round(value["sum"] / value["count"], 6),
+                            "max": round(value["max"], 6),
+                        }
+
+                    report.setdefault(kind, {}).setdefault(name, []).append(
+                        {"labels": dict(labels), "value": value}
+                    )
+
+        return report
+
+    def prometheus(self, prefix: str = "swissquote_") -> str:
+        lines = []
+        with self.lock:
+            for kind, series in [
+                ("counter", self.counters),
+                ("gauge", self.gauges),
+                ("histogram", self.histograms),
+            ]:
+                typed = set()
+                for (name, labels), value in sorted(series.items()):
+                    name = prefix + name
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f"# TYPE {name} {kind}")
+
+                    if kind != "histogram":
+                        lines.append(f"{name}{_labels(labels)} {value}")
+                        continue
+
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ["+Inf"], value["buckets"]):
+                        cumulative += count
+                        le = _labels(labels + (("le", str(bound)),))
+                        lines.append(f"{name}_bucket{le} {cumulative}")
+
+                    lines.append(f"{name}_sum{_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, fmt: str = "json") -> None:
+        if fmt == "prometheus":
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.report(), indent=2, default=str)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+
+        os.replace(f"{path}.tmp", path)
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + pairs + "}"
+
+
+metrics = Metrics()
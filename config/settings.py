@@ -1,20 +1,73 @@
-from decouple import config
+from decouple import Csv, config
 
-LOG_LEVEL = config("LOG_LEVEL", default="INFO")
-TOKEN = config("TOKEN")
-STATICLISTS_OUTPUT_TABLE = config("STATICLISTS_OUTPUT_TABLE")
-TRANSACTIONS_OUTPUT_TABLE = config("TRANSACTIONS_OUTPUT_TABLE")
-POSITIONS_OUTPUT_TABLE = config("POSITIONS_OUTPUT_TABLE")
-SECURITIES_OUTPUT_TABLE = config("SECURITIES_OUTPUT_TABLE")
-BUYINGPOWERS_OUTPUT_TABLE = config("BUYINGPOWERS_OUTPUT_TABLE")
-CLIENTS_OUTPUT_TABLE = config("CLIENTS_OUTPUT_TABLE")
-INSERTER_MAX_RETRIES = config("INSERTER_MAX_RETRIES", default=3, cast=int)
-REQUEST_MAX_RETRIES = config("REQUEST_MAX_RETRIES", default=3, cast=int)
-REQUEST_BACKOFF_FACTOR = config("REQUEST_BACKOFF_FACTOR", default=2, cast=float)
-MSSQL_AD_LOGIN = config("MSSQL_AD_LOGIN", cast=bool, default=False)
-MSSQL_SERVER = config("MSSQL_SERVER")
-MSSQL_DATABASE = config("MSSQL_DATABASE")
+# every setting is read from the environment / .env on first access, so a
+# stage never requires (or pays for) the settings of the stages it skips
+SETTINGS = {
+    "LOG_LEVEL": dict(default="INFO"),
+    "METRICS_PATH": dict(default=""),
+    "METRICS_FORMAT": dict(default="json"),
+    "TOKEN": {},
+    "STATICLISTS_OUTPUT_TABLE": {},
+    "TRANSACTIONS_OUTPUT_TABLE": {},
+    "POSITIONS_OUTPUT_TABLE": {},
+    "SECURITIES_OUTPUT_TABLE": {},
+    "BUYINGPOWERS_OUTPUT_TABLE": {},
+    "CLIENTS_OUTPUT_TABLE": {},
+    "INSERTER_MAX_RETRIES": dict(default=3, cast=int),
+    "INSERTER_BACKOFF_FACTOR": dict(default=1, cast=float),
+    "INSERT_CHECKPOINT_DIR": dict(default=""),
+    "INSERT_CHUNK_SIZE": dict(default=0, cast=int),
+    "INSERT_WORKERS": dict(default=4, cast=int),
+    "REQUEST_MAX_RETRIES": dict(default=3, cast=int),
+    "REQUEST_BACKOFF_FACTOR": dict(default=2, cast=float),
+    "REQUEST_MAX_WORKERS": dict(default=8, cast=int),
+    "REQUEST_MAX_PAGE_WORKERS": dict(default=4, cast=int),
+    "REQUEST_ASYNC": dict(default=False, cast=bool),
+    "REQUEST_HTTP2": dict(default=False, cast=bool),
+    "SNAPSHOT_DIR": dict(default=""),
+    "REQUEST_RATE_LIMIT": dict(default=0, cast=float),
+    "REQUEST_RATE_LIMIT_MAX": dict(default=0, cast=float),
+    "REQUEST_LATENCY_TARGET": dict(default=0, cast=float),
+    "REQUEST_JSON_DECODER": dict(default="auto"),
+    "PAGE_HISTORY_PATH": dict(default=""),
+    "RESPONSE_CACHE_DIR": dict(default=""),
+    "RESPONSE_CACHE_SIZE": dict(default=128, cast=int),
+    "STATICLISTS_CACHE_TTL": dict(default=86400, cast=int),
+    "RATES_CACHE_TTL": dict(default=3600, cast=int),
+    "FETCH_BUYINGPOWERS": dict(default=False, cast=bool),
+    "TRANSACTIONS_INCREMENTAL": dict(default=False, cast=bool),
+    "TRANSACTIONS_MERGE_KEYS": dict(default="", cast=Csv()),
+    "POSITIONS_MERGE_KEYS": dict(default="", cast=Csv()),
+    "SECURITIES_MERGE_KEYS": dict(default="", cast=Csv()),
+    "STATICLISTS_MERGE_KEYS": dict(default="", cast=Csv()),
+    "CLIENTS_MERGE_KEYS": dict(default="", cast=Csv()),
+    "BUYINGPOWERS_MERGE_KEYS": dict(default="", cast=Csv()),
+    "FINGERPRINT_PATH": dict(default=""),
+    "TRANSFORM_ENGINE": dict(default="pandas"),
+    "SHARD_COUNT": dict(default=1, cast=int),
+    "SHARD_INDEX": dict(default=0, cast=int),
+    "SHARD_PROCESSES": dict(default=0, cast=int),
+    "SHARD_DIR": dict(default="shards"),
+    "STREAM": dict(default=False, cast=bool),
+    "STREAM_CHUNK_SIZE": dict(default=100000, cast=int),
+    "STREAM_QUEUE_SIZE": dict(default=256, cast=int),
+    "SINK": dict(default="mssql", cast=Csv()),
+    "PARQUET_DIR": dict(default=""),
+    "PARQUET_ROW_GROUP_SIZE": dict(default=100000, cast=int),
+    "PARQUET_COMPRESSION": dict(default="zstd"),
+    "MSSQL_AD_LOGIN": dict(cast=bool, default=False),
+    "MSSQL_SERVER": {},
+    "MSSQL_DATABASE": {},
+    "MSSQL_MAX_CONNECTIONS": dict(default=8, cast=int),
+    "MSSQL_USERNAME": {},
+    "MSSQL_PASSWORD": {},
+}
 
-if not MSSQL_AD_LOGIN:
-    MSSQL_USERNAME = config("MSSQL_USERNAME")
-    MSSQL_PASSWORD = config("MSSQL_PASSWORD")
+
+def __getattr__(name):
+    if name not in SETTINGS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = config(name, **SETTINGS[name])
+    globals()[name] = value
+    return value
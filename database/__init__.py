@@ -1 +1,11 @@
-from .mssql import MSSQLDatabase
+from .checkpoint import Checkpoint
+
+
+def __getattr__(name):
+    # pyodbc, fast_to_sql and azure.identity load with the first connection
+    if name == "MSSQLDatabase":
+        from .mssql import MSSQLDatabase
+
+        return MSSQLDatabase
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
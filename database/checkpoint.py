@@ -0,0 +1,91 @@
+import json
+import os
+import pickle
+import threading
+
+from config import logger
+
+
+class Checkpoint:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.data_path = os.path.join(directory, "data.pkl")
+        self.state = {"tables": {}}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.state_path) and os.path.exists(self.data_path)
+
+    def start(self, df_transformed, watermarks=None, replaced=None) -> None:
+        # persist the transformed frames first, so a crashed load can be
+        # resumed without fetching or transforming again
+        with open(self.data_path, "wb") as f:
+            pickle.dump((df_transformed, watermarks, replaced), f)
+
+        self.state = {"tables": {}}
+        self.save()
+
+    def resume(self) -> tuple:
+        with open(self.state_path, encoding="utf-8") as f:
+            self.state = json.load(f)
+
+        with open(self.data_path, "rb") as f:
+            data = pickle.load(f)
+
+        done = [name for name, table in self.state["tables"].items() if table["done"]]
+        logger.info(f"Resuming load from checkpoint, completed tables: {done}")
+        return data
+
+    def table(self, name: str) -> "TableCheckpoint":
+        return TableCheckpoint(self, name)
+
+    def save(self) -> None:
+        with self.lock:
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+
+            os.replace(tmp_path, self.state_path)
+
+    def clear(self) -> None:
+        for path in [self.state_path, self.data_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class TableCheckpoint:
+    def __init__(self, checkpoint: Checkpoint, name: str) -> None:
+        self.checkpoint = checkpoint
+        with checkpoint.lock:
+            self.record = checkpoint.state["tables"].setdefault(
+                name, {"stage": None, "chunk_size": None, "chunks": [], "done": False}
+            )
+
+    @property
+    def done(self) -> bool:
+        return self.record["done"]
+
+    def stage(self, chunk_size: int):
+        if self.record["chunk_size"] != chunk_size:
+            return None
+
+        return self.record["stage"]
+
+    def committed(self) -> set:
+        return set(self.record["chunks"])
+
+    def start_stage(self, stage_name: str, chunk_size: int) -> None:
+        self.record.update(stage=stage_name, chunk_size=chunk_size, chunks=[])
+        self.checkpoint.save()
+
+    def add_chunk(self, number: int) -> None:
+        with self.checkpoint.lock:
+            self.record["chunks"].append(number)
+
+        self.checkpoint.save()
+
+    def mark_done(self) -> None:
+        self.record.update(done=True, stage=None, chunks=[])
+        self.checkpoint.save()
@@ -1,22 +1,167 @@
-import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from config import logger, settings
 from database import MSSQLDatabase
+from database.sinks import CLIENT_KEYS, stage, stage_tables
 
 
 def init_db_instance():
     return MSSQLDatabase()
 
 
-def insert_data(df_transformed):
-    threads = []
+def table_name(name):
+    # buying power sub-lists go to their own tables next to the main one
+    if name.startswith("buyingpowers_"):
+        sub = name[len("buyingpowers_") :]  # noqa: E203
+        return f"{settings.BUYINGPOWERS_OUTPUT_TABLE}_{sub}"
+
+    return getattr(settings, f"{name.upper()}_OUTPUT_TABLE")
+
+
+def insert_data(
+    df_transformed,
+    watermarks=None,
+    replaced=None,
+    delete_prev_records=True,
+    checkpoint=None,
+):
+    replaced = replaced or {}
+    with ThreadPoolExecutor(max_workers=max(len(df_transformed), 1)) as executor:
+        futures = []
+        for name, df in df_transformed.items():
+            table_checkpoint = checkpoint.table(name) if checkpoint else None
+            if table_checkpoint and table_checkpoint.done:
+                logger.info(f"Skipping {table_name(name)}, already loaded")
+                continue
+
+            inserter = init_db_instance()
+            kwargs = {
+                "delete_prev_records": delete_prev_records,
+                "delete_where": delete_where(name, df, watermarks, replaced),
+                "merge_keys": getattr(settings, f"{name.upper()}_MERGE_KEYS", None),
+                "checkpoint": table_checkpoint,
+            }
+            logger.info(f"Inserting Data into {table_name(name)}")
+            futures.append(
+                executor.submit(inserter.insert_table, df, table_name(name), **kwargs)
+            )
+
+        for name, clientids in replaced.items():
+            for table in stage_tables(name):
+                if table not in df_transformed and clientids:
+                    futures.append(executor.submit(delete_clients, table, clientids))
+
+    for future in futures:
+        future.result()
+
+
+def stage_data(df_transformed, stages, watermarks=None):
+    # streamed chunks go into one staging table per table, so a failed stream
+    # leaves the tables as they were; commit_stages writes them once it is done
     for name, df in df_transformed.items():
+        staged = stages.setdefault(
+            name, {"stage": None, "columns": df.columns.tolist(), "delete_where": None}
+        )
+        staged["stage"] = init_db_instance().append_stage(
+            df, table_name(name), staged["stage"]
+        )
+        where = delete_where(name, df, watermarks, {})
+        if where:
+            condition, params = staged["delete_where"] or (where[0], [])
+            staged["delete_where"] = (condition, params + where[1])
+
+
+def commit_stages(stages):
+    with ThreadPoolExecutor(max_workers=max(len(stages), 1)) as executor:
+        futures = [
+            executor.submit(
+                init_db_instance().swap_stage,
+                staged["stage"],
+                table_name(name),
+                staged["columns"],
+                staged["delete_where"],
+                getattr(settings, f"{name.upper()}_MERGE_KEYS", None),
+            )
+            for name, staged in stages.items()
+        ]
+
+    for future in futures:
+        future.result()
+
+
+def drop_stages(stages):
+    for staged in stages.values():
+        init_db_instance().drop_table(staged["stage"])
+
+
+def delete_clients(name, clientids):
+    inserter = init_db_instance()
+    if not inserter.table_exists(table_name(name)):
+        return
+
+    inserter.reopen_connection()
+    try:
+        inserter.delete_rows(
+            table_name(name),
+            f"{CLIENT_KEYS[stage(name)]} = ?",
+            [(clientid,) for clientid in clientids],
+        )
+        inserter.cnx.commit()
+    finally:
+        inserter.release_connection()
+
+
+def delete_departed_clients(clientids):
+    # rows of clients no longer managed, which no shard replaces any more
+    clientids = {str(clientid) for clientid in clientids}
+    names = [name for endpoint in CLIENT_KEYS for name in stage_tables(endpoint)]
+    for name in names:
+        key = CLIENT_KEYS[stage(name)]
         inserter = init_db_instance()
-        table_name = getattr(settings, f"{name.upper()}_OUTPUT_TABLE")
-        logger.info(f"Inserting Data into {table_name}")
-        t = threading.Thread(target=inserter.insert_table, args=(df, table_name))
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
+        if not inserter.table_exists(table_name(name)):
+            continue
+
+        df = inserter.select_table(f"SELECT DISTINCT {key} FROM {table_name(name)}")
+        departed = [c for c in df[key].tolist() if str(c) not in clientids]
+        if departed:
+            logger.info(f"Deleting {len(departed)} departed clients from {name}")
+            delete_clients(name, departed)
+
+
+def fetch_watermarks():
+    df = init_db_instance().select_table(
+        f"SELECT clientId, MAX(operationDate) AS operationDate "
+        f"FROM {table_name('transactions')} GROUP BY clientId"
+    )
+    df = df.dropna(subset=["operationDate"])
+    watermarks = {
+        str(clientid): operation_date.date()
+        for clientid, operation_date in zip(df["clientId"], df["operationDate"])
+    }
+    logger.info(f"Loaded transaction watermarks for {len(watermarks)} clients")
+    return watermarks
+
+
+def delete_where(name, df, watermarks, replaced):
+    # transactions re-fetched from each client's watermark date onward and
+    # the payloads of changed clients replace only their own rows; securities
+    # then only cover part of the book, so they are replaced by key as well
+    if name == "transactions" and watermarks is not None:
+        clientids = set(df["clientId"].astype(str))
+        params = [
+            (clientid, watermark)
+            for clientid, watermark in watermarks.items()
+            if clientid in clientids
+        ]
+        return ("clientId = ? AND operationDate >= ?", params)
+
+    if stage(name) in replaced:
+        params = [(clientid,) for clientid in replaced[stage(name)]]
+        return (f"{CLIENT_KEYS[stage(name)]} = ?", params)
+
+    if name == "securities" and (watermarks is not None or replaced):
+        securityids = df["securityId"].dropna().unique().tolist()
+        params = [(securityid,) for securityid in securityids]
+        return ("securityId = ?", params)
+
+    return None
@@ -1,23 +1,56 @@
-import struct
+import time
+import uuid
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import pyodbc
-from azure.identity import DefaultAzureCredential
 from fast_to_sql import fast_to_sql
 
-from config import logger, settings
+from config import logger, metrics, settings
+from database.pool import ConnectionPool, TokenCache
 
 warnings.filterwarnings("ignore")
 
 
-def pyodbc_attrs(access_token: str) -> dict:
-    SQL_COPT_SS_ACCESS_TOKEN = 1256
-    token_bytes = bytes(access_token, "utf-8")
-    exp_token = b""
-    for i in token_bytes:
-        exp_token += bytes({i}) + bytes(1)
-    return {SQL_COPT_SS_ACCESS_TOKEN: struct.pack("=i", len(exp_token)) + exp_token}
+def merge_statement(table_name, stage_name, columns, keys, delete_missing=False):
+    on = " AND ".join(f"target.[{key}] = source.[{key}]" for key in keys)
+    updates = ", ".join(
+        f"target.[{column}] = source.[{column}]"
+        for column in columns
+        if column not in keys
+    )
+    names = ", ".join(f"[{column}]" for column in columns)
+    values = ", ".join(f"source.[{column}]" for column in columns)
+    matched = f"WHEN MATCHED THEN UPDATE SET {updates} " if updates else ""
+    # a full refresh also drops the rows that are gone upstream
+    missing = " WHEN NOT MATCHED BY SOURCE THEN DELETE" if delete_missing else ""
+    return (
+        f"MERGE {table_name} WITH (HOLDLOCK) AS target "
+        f"USING {stage_name} AS source ON {on} "
+        f"{matched}"
+        f"WHEN NOT MATCHED BY TARGET THEN INSERT ({names}) VALUES ({values})"
+        f"{missing};"
+    )
+
+
+def custom_types(df):
+    return {
+        column: "datetime" for column in df.columns if "timestamp" in column.lower()
+    }
+
+
+def retry(label, func, *args):
+    for attempt in range(settings.INSERTER_MAX_RETRIES + 1):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == settings.INSERTER_MAX_RETRIES:
+                raise
+
+            delay = settings.INSERTER_BACKOFF_FACTOR * 2**attempt
+            logger.warning(f"{label} failed: {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
 
 
 class MSSQLDatabase(object):
@@ -28,8 +61,13 @@ class MSSQLDatabase(object):
         USERNAME = settings.MSSQL_USERNAME
         PASSWORD = settings.MSSQL_PASSWORD
 
+    CHUNK_SIZE = settings.INSERT_CHUNK_SIZE
+    INSERT_WORKERS = settings.INSERT_WORKERS
+    POOL = ConnectionPool(settings.MSSQL_MAX_CONNECTIONS)
+    TOKENS = TokenCache("https://database.windows.net/.default")
+
     def __init__(self):
-        self.cnx_kwargs = {}
+        self.cnx = None
         if not self.AD_LOGIN:
             self.cnx_str = (
                 "DRIVER={ODBC Driver 18 for SQL Server};"
@@ -37,24 +75,26 @@ class MSSQLDatabase(object):
                 f"UID={self.USERNAME};PWD={self.PASSWORD}"
             )
         else:
-            token = self.fecth_token()
-            self.cnx_kwargs["attrs_before"] = pyodbc_attrs(token)
             self.cnx_str = (
                 "DRIVER={ODBC Driver 18 for SQL Server};"
                 f"SERVER={self.SERVER};DATABASE={self.DATABASE};Encrypt=yes"
             )
 
     def _get_connection(self):
-        return pyodbc.connect(self.cnx_str, **self.cnx_kwargs)
+        cnx_kwargs = {}
+        if self.AD_LOGIN:
+            cnx_kwargs["attrs_before"] = self.TOKENS.attrs_before()
+
+        return pyodbc.connect(self.cnx_str, **cnx_kwargs)
 
     def reopen_connection(self):
-        try:
-            if hasattr(self, "cnx") and self.cnx:
-                self.cnx.close()
-        except Exception as e:
-            logger.warning(f"Error closing stale connection: {e}")
+        self.release_connection()
+        self.cnx = self.POOL.acquire(self._get_connection)
 
-        self.cnx = self._get_connection()
+    def release_connection(self):
+        if self.cnx is not None:
+            self.POOL.release(self.cnx)
+            self.cnx = None
 
     def select_table(self, query):
         self.reopen_connection()
@@ -67,44 +107,287 @@ class MSSQLDatabase(object):
             logger.error(f"Error executing SELECT query: {e}")
             raise
         finally:
-            self.cnx.close()
+            self.release_connection()
 
     def insert_table(
-        self, df, table_name, if_exists="append", delete_prev_records=True
+        self,
+        df,
+        table_name,
+        if_exists="append",
+        delete_prev_records=True,
+        delete_where=None,
+        merge_keys=None,
+        checkpoint=None,
     ):
+        custom = custom_types(df)
+        columns = df.columns.tolist()
+        if merge_keys:
+            df = df.drop_duplicates(subset=merge_keys, keep="last")
+
+        stage_name = None
+        start = time.perf_counter()
+        try:
+            if self.CHUNK_SIZE and len(df) > self.CHUNK_SIZE:
+                stage_name = self.stage_chunks(df, table_name, custom, checkpoint)
+
+            retry(
+                f"Writing {table_name}",
+                self.write_table,
+                df,
+                table_name,
+                columns,
+                custom,
+                if_exists,
+                delete_prev_records,
+                delete_where,
+                merge_keys,
+                stage_name,
+            )
+        except Exception as e:
+            logger.error(f"Error inserting into table {table_name}: {e}")
+            # a checkpointed run keeps its committed chunks for the resume
+            if stage_name and not checkpoint:
+                self.drop_table(stage_name)
+            raise
+
+        elapsed = time.perf_counter() - start
+        metrics.set("insert_seconds", elapsed, table=table_name)
+        metrics.set("insert_rows", len(df), table=table_name)
+        if checkpoint:
+            checkpoint.mark_done()
+
+    def write_table(
+        self,
+        df,
+        table_name,
+        columns,
+        custom,
+        if_exists,
+        delete_prev_records,
+        delete_where,
+        merge_keys,
+        stage_name,
+    ):
+        # a streamed table arrives as a filled staging table only
+        rows = f"{len(df)} rows" if df is not None else f"the rows of {stage_name}"
         self.reopen_connection()
-        if delete_prev_records:
-            try:
-                query = f"DELETE FROM {table_name}"
-                cursor = self.cnx.cursor()
-                cursor.execute(query)
-            except Exception as e:
-                logger.error(f"Error on deleting {table_name} rows: {e}")
+        try:
+            cursor = self.cnx.cursor()
+            if merge_keys:
+                source = stage_name or self.stage_rows(df, table_name, custom)
+                # replaced clients and watermarked transactions lose the rows
+                # the payload no longer has, in the same transaction
+                if delete_where:
+                    self.delete_rows(table_name, *delete_where)
+
+                cursor.execute(
+                    merge_statement(
+                        table_name,
+                        source,
+                        columns,
+                        merge_keys,
+                        delete_missing=not delete_where and delete_prev_records,
+                    )
+                )
+                # pooled connections outlive the insert, and their temp tables
+                # with them
+                if source != stage_name:
+                    cursor.execute(f"DROP TABLE {source}")
+
+                logger.info(f"Merged {rows} into {table_name} table")
+            else:
+                if delete_where:
+                    self.delete_rows(table_name, *delete_where)
+                elif delete_prev_records:
+                    cursor.execute(f"DELETE FROM {table_name}")
+
+                if stage_name:
+                    cursor.execute(
+                        f"INSERT INTO {table_name} SELECT * FROM {stage_name}"
+                    )
+                else:
+                    fast_to_sql(
+                        df=df,
+                        name=table_name,
+                        conn=self.cnx,
+                        if_exists=if_exists,
+                        custom=custom,
+                    )
+                logger.info(f"Inserted {rows} into {table_name} table")
 
-        custom = {}
+            if stage_name:
+                cursor.execute(f"DROP TABLE {stage_name}")
 
-        for column in df.columns.tolist():
-            if "timestamp" in column.lower():
-                custom[column] = "datetime"
+            self.cnx.commit()
+        except Exception:
+            self.cnx.rollback()
+            raise
+        finally:
+            self.release_connection()
+
+    def delete_rows(self, table_name, condition, params):
+        if not params:
+            return
 
+        query = f"DELETE FROM {table_name} WHERE {condition}"
+        cursor = self.cnx.cursor()
+        cursor.executemany(query, params)
+        logger.info(f"Deleted {table_name} rows for {len(params)} keys")
+
+    def stage_rows(self, df, table_name, custom):
+        # a temp table is private to this connection and dropped on rollback
+        stage_name = f"#stage_{table_name.replace('.', '_')}"
+        cursor = self.cnx.cursor()
+        cursor.execute(f"SELECT TOP 0 * INTO {stage_name} FROM {table_name}")
+        fast_to_sql(
+            df=df,
+            name=stage_name,
+            conn=self.cnx,
+            if_exists="append",
+            custom=custom,
+            temp=True,
+        )
+        return stage_name
+
+    def stage_chunks(self, df, table_name, custom, checkpoint=None):
+        # chunks are written over several connections, so the staging table
+        # has to be a regular table; each chunk commits on its own
+        stage_name, committed = None, set()
+        if checkpoint:
+            stage_name = checkpoint.stage(self.CHUNK_SIZE)
+
+        if stage_name and self.table_exists(stage_name):
+            committed = checkpoint.committed()
+            logger.info(f"Resuming {stage_name} with {len(committed)} chunks loaded")
+        else:
+            stage_name = f"{table_name}_stage_{uuid.uuid4().hex[:8]}"
+            self.create_stage(stage_name, table_name)
+            if checkpoint:
+                checkpoint.start_stage(stage_name, self.CHUNK_SIZE)
+
+        starts = range(0, len(df), self.CHUNK_SIZE)
+        pending = [
+            (number, start)
+            for number, start in enumerate(starts, 1)
+            if number not in committed
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=self.INSERT_WORKERS) as executor:
+                futures = {
+                    number: executor.submit(
+                        retry,
+                        f"Loading chunk {number}/{len(starts)} into {stage_name}",
+                        type(self)().load_chunk,
+                        df.iloc[start : start + self.CHUNK_SIZE],  # noqa: E203
+                        stage_name,
+                        custom,
+                        f"chunk {number}/{len(starts)}",
+                    )
+                    for number, start in pending
+                }
+
+                errors = []
+                for number, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+
+                    if checkpoint:
+                        checkpoint.add_chunk(number)
+
+            if errors:
+                raise errors[0]
+        except Exception:
+            if not checkpoint:
+                self.drop_table(stage_name)
+            raise
+
+        return stage_name
+
+    def append_stage(self, df, table_name, stage_name=None):
+        # streamed chunks collect in a staging table, which swap_stage then
+        # writes into the table at once
+        if stage_name is None:
+            stage_name = f"{table_name}_stage_{uuid.uuid4().hex[:8]}"
+            self.create_stage(stage_name, table_name)
+
+        retry(
+            f"Loading into {stage_name}",
+            self.load_chunk,
+            df,
+            stage_name,
+            custom_types(df),
+            f"{len(df)} rows",
+        )
+        return stage_name
+
+    def swap_stage(
+        self, stage_name, table_name, columns, delete_where=None, merge_keys=None
+    ):
+        start = time.perf_counter()
+        retry(
+            f"Writing {table_name}",
+            self.write_table,
+            None,
+            table_name,
+            columns,
+            {},
+            "append",
+            True,
+            delete_where,
+            merge_keys,
+            stage_name,
+        )
+        metrics.set("insert_seconds", time.perf_counter() - start, table=table_name)
+
+    def create_stage(self, stage_name, table_name):
+        self.reopen_connection()
+        try:
+            self.cnx.cursor().execute(
+                f"SELECT TOP 0 * INTO {stage_name} FROM {table_name}"
+            )
+            self.cnx.commit()
+        finally:
+            self.release_connection()
+
+    def table_exists(self, table_name):
+        self.reopen_connection()
+        try:
+            cursor = self.cnx.cursor()
+            cursor.execute(f"SELECT OBJECT_ID('{table_name}', 'U')")
+            return cursor.fetchall()[0][0] is not None
+        finally:
+            self.release_connection()
+
+    def load_chunk(self, df, table_name, custom, label):
+        started = time.perf_counter()
+        self.reopen_connection()
         try:
             fast_to_sql(
                 df=df,
                 name=table_name,
                 conn=self.cnx,
-                if_exists=if_exists,
+                if_exists="append",
                 custom=custom,
             )
-            logger.info(f"Inserted {len(df)} rows into {table_name} table")
             self.cnx.commit()
-        except Exception as e:
-            logger.error(f"Error inserting into table {table_name}: {e}")
-            raise
         finally:
-            self.cnx.close()
+            self.release_connection()
 
-    @staticmethod
-    def fecth_token():
-        credential = DefaultAzureCredential(exclude_shared_token_cache_credential=True)
-        token = credential.get_token("https://database.windows.net/.default").token
-        return token
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Loaded {label} into {table_name}: {len(df)} rows in {elapsed:.2f}s "
+            f"({len(df) / elapsed:.0f} rows/s)"
+        )
+
+    def drop_table(self, table_name):
+        self.reopen_connection()
+        try:
+            self.cnx.cursor().execute(f"DROP TABLE IF EXISTS {table_name}")
+            self.cnx.commit()
+        except Exception as e:
+            logger.warning(f"Could not drop {table_name}: {e}")
+        finally:
+            self.release_connection()
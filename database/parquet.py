@@ -0,0 +1,271 @@
+import datetime
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import logger, metrics
+from database.sinks import CLIENT_KEYS, stage
+
+# low-cardinality strings, stored dictionary-encoded and read back as such
+DICTIONARY_COLUMNS = [
+    "source",
+    "currency",
+    "accountCurrency",
+    "refCurrency",
+    "referenceCurrency",
+    "transactionCode",
+    "transactionCodeDescription",
+    "operationTypeCode",
+    "actionType",
+    "cotationType",
+    "securityType",
+    "type",
+    "preferredLanguage",
+]
+NULL_PARTITION = "unknown"
+
+
+def to_table(df) -> pa.Table:
+    arrays = {}
+    for column in df.columns:
+        try:
+            array = pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            logger.debug(f"Writing {column} as strings: {e}")
+            array = pa.array(df[column].astype("string"), from_pandas=True)
+
+        if column in DICTIONARY_COLUMNS and (
+            pa.types.is_string(array.type) or pa.types.is_large_string(array.type)
+        ):
+            array = array.dictionary_encode()
+
+        arrays[column] = array
+
+    return pa.table(arrays)
+
+
+def is_in(column, values) -> pa.ChunkedArray:
+    # client ids come back from fingerprints and watermarks as strings
+    try:
+        value_set = pa.array(list(values), from_pandas=True).cast(column.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        column = pc.cast(column, pa.string())
+        value_set = pa.array([str(value) for value in values])
+
+    return pc.fill_null(pc.is_in(column, value_set=value_set), False)
+
+
+def before(column, watermark) -> pa.ChunkedArray:
+    # rows without a date are kept, as a SQL comparison with NULL never matches
+    bound = pa.scalar(datetime.datetime.combine(watermark, datetime.time.min))
+    return pc.fill_null(pc.less(column, bound.cast(column.type)), True)
+
+
+class ParquetSink:
+    def __init__(self, directory, row_group_size=100000, compression="zstd"):
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, df_transformed, watermarks=None, replaced=None, checkpoint=None):
+        # every write replaces the same rows again, so a resumed load simply
+        # writes all tables once more and needs no checkpoint
+        replaced = replaced or {}
+        for name, df in df_transformed.items():
+            logger.info(f"Writing {name} to {self.directory}")
+            with metrics.timer("sink_seconds", sink="parquet", table=name):
+                if name == "transactions":
+                    self.write_transactions(df, watermarks, replaced)
+                else:
+                    self.write_table(name, df, watermarks, replaced)
+
+            metrics.set("sink_rows", len(df), sink="parquet", table=name)
+
+        for name, clientids in replaced.items():
+            if clientids:
+                self.delete_clients(name, clientids, skip=df_transformed)
+
+    def write_table(self, name, df, watermarks, replaced):
+        path = self.path(name)
+        table = to_table(df)
+        if os.path.exists(path):
+            kept = self.kept(name, pq.read_table(path), df, watermarks, replaced)
+            if kept is not None:
+                table = pa.concat_tables([kept, table], promote_options="permissive")
+
+        self.write_file(path, table)
+
+    @staticmethod
+    def kept(name, existing, df, watermarks, replaced):
+        # the stored rows the new ones do not replace, as delete_where does for
+        # SQL Server; None replaces the whole table
+        if stage(name) in replaced:
+            key, clientids = CLIENT_KEYS[stage(name)], replaced[stage(name)]
+            return existing.filter(pc.invert(is_in(existing[key], clientids)))
+
+        if name == "securities" and (watermarks is not None or replaced):
+            securityids = df["securityId"].dropna().unique().tolist()
+            return existing.filter(
+                pc.invert(is_in(existing["securityId"], securityids))
+            )
+
+        return None
+
+    def write_transactions(self, df, watermarks, replaced):
+        # hive partitions by operation month and client, the client column
+        # lives in the directory name only
+        root = self.path("transactions", partitioned=True)
+        table = to_table(df).drop_columns(["clientId"])
+        months = np.datetime_as_string(
+            df["operationDate"].to_numpy().astype("datetime64[M]")
+        ).astype(object)
+        months[months == "NaT"] = NULL_PARTITION
+        clients = df["clientId"].astype(str)
+        groups = pd.Series(range(len(df))).groupby([months, clients]).indices
+        parts = {key: table.take(rows) for key, rows in groups.items()}
+
+        if watermarks is None and "transactions" not in replaced:
+            self.replace_partitions(root, parts)
+            return
+
+        for (month, clientid), part in self.merge_partitions(
+            root, parts, watermarks or {}, replaced.get("transactions", [])
+        ).items():
+            path = self.partition_path(root, month, clientid)
+            if part.num_rows:
+                self.write_file(path, part)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def merge_partitions(self, root, parts, watermarks, replaced) -> dict:
+        replaced = {str(clientid) for clientid in replaced}
+        clientids = {clientid for _, clientid in parts} | replaced
+        merged = dict(parts)
+        for clientid in clientids:
+            watermark = watermarks.get(clientid)
+            for month in self.partition_months(root, clientid):
+                if watermark is not None and (
+                    month == NULL_PARTITION or month < f"{watermark:%Y-%m}"
+                ):
+                    continue
+
+                existing = None
+                if clientid not in replaced:
+                    existing = self.read_partition(root, month, clientid)
+
+                if existing is not None and watermark is not None:
+                    existing = existing.filter(
+                        before(existing["operationDate"], watermark)
+                    )
+
+                part = merged.get((month, clientid))
+                tables = [t for t in [existing, part] if t is not None]
+                merged[(month, clientid)] = (
+                    pa.concat_tables(tables, promote_options="permissive")
+                    if tables
+                    else pa.table({})
+                )
+
+        return merged
+
+    def replace_partitions(self, root, parts):
+        tmp_root = f"{root}.tmp"
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        for (month, clientid), part in parts.items():
+            self.write_file(self.partition_path(tmp_root, month, clientid), part)
+
+        old_root = f"{root}.old"
+        shutil.rmtree(old_root, ignore_errors=True)
+        if os.path.exists(root):
+            os.replace(root, old_root)
+
+        os.makedirs(tmp_root, exist_ok=True)
+        os.replace(tmp_root, root)
+        shutil.rmtree(old_root, ignore_errors=True)
+
+    def delete_clients(self, name, clientids, skip=()):
+        # every stored table of the stage, sub-tables without a frame included
+        for path in glob.glob(os.path.join(self.directory, f"{name}*.parquet")):
+            table_name = os.path.basename(path)[: -len(".parquet")]
+            if stage(table_name) != name or table_name in skip:
+                continue
+
+            existing = pq.read_table(path)
+            key = CLIENT_KEYS[name]
+            self.write_file(
+                path, existing.filter(pc.invert(is_in(existing[key], clientids)))
+            )
+
+    def watermarks(self) -> dict:
+        root = self.path("transactions", partitioned=True)
+        if not os.path.isdir(root):
+            return {}
+
+        table = pq.read_table(
+            root, columns=["clientId", "operationDate"], partitioning="hive"
+        )
+        table = table.group_by("clientId").aggregate([("operationDate", "max")])
+        watermarks = {
+            str(clientid): operation_date.date()
+            for clientid, operation_date in zip(
+                table["clientId"].to_pylist(), table["operationDate_max"].to_pylist()
+            )
+            if operation_date is not None
+        }
+        logger.info(f"Loaded transaction watermarks for {len(watermarks)} clients")
+        return watermarks
+
+    def write_file(self, path, table):
+        directory, filename = os.path.split(path)
+        os.makedirs(directory, exist_ok=True)
+        # dot files are skipped by dataset readers while being written
+        tmp_path = os.path.join(directory, f".{filename}.tmp")
+        dictionary = [
+            field.name
+            for field in table.schema
+            if pa.types.is_dictionary(field.type)
+        ]
+        with pq.ParquetWriter(
+            tmp_path,
+            table.schema,
+            compression=self.compression,
+            use_dictionary=dictionary,
+        ) as writer:
+            for offset in range(0, max(table.num_rows, 1), self.row_group_size):
+                writer.write_table(table.slice(offset, self.row_group_size))
+
+        os.replace(tmp_path, path)
+
+    def path(self, name, partitioned=False):
+        if partitioned:
+            return os.path.join(self.directory, name)
+
+        return os.path.join(self.directory, f"{name}.parquet")
+
+    @staticmethod
+    def partition_path(root, month, clientid):
+        return os.path.join(
+            root, f"operationMonth={month}", f"clientId={clientid}", "part-0.parquet"
+        )
+
+    @staticmethod
+    def partition_months(root, clientid):
+        pattern = os.path.join(root, "operationMonth=*", f"clientId={clientid}")
+        return [
+            os.path.basename(os.path.dirname(path))[len("operationMonth=") :]  # noqa
+            for path in glob.glob(pattern)
+        ]
+
+    def read_partition(self, root, month, clientid):
+        path = self.partition_path(root, month, clientid)
+        if not os.path.exists(path):
+            return None
+
+        return pq.read_table(path)
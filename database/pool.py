@@ -0,0 +1,75 @@
+import queue
+import struct
+import threading
+import time
+
+from azure.identity import DefaultAzureCredential
+
+from config import logger
+
+
+def pyodbc_attrs(access_token: str) -> dict:
+    SQL_COPT_SS_ACCESS_TOKEN = 1256
+    exp_token = access_token.encode("utf-16-le")
+    return {SQL_COPT_SS_ACCESS_TOKEN: struct.pack("=i", len(exp_token)) + exp_token}
+
+
+class TokenCache:
+    REFRESH_MARGIN = 300
+
+    def __init__(self, scope: str) -> None:
+        self.scope = scope
+        self.credential = None
+        self.token = None
+        self.attrs = None
+        self.lock = threading.Lock()
+
+    def attrs_before(self) -> dict:
+        with self.lock:
+            if (
+                self.token is None
+                or self.token.expires_on - time.time() < self.REFRESH_MARGIN
+            ):
+                if self.credential is None:
+                    self.credential = DefaultAzureCredential(
+                        exclude_shared_token_cache_credential=True
+                    )
+
+                self.token = self.credential.get_token(self.scope)
+                self.attrs = pyodbc_attrs(self.token.token)
+                logger.debug("Refreshed database access token")
+
+            return self.attrs
+
+
+class ConnectionPool:
+    def __init__(self, max_connections: int) -> None:
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_connections)
+
+    def acquire(self, connect):
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            return connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, cnx) -> None:
+        # a connection that cannot be rolled back is broken and not reused
+        try:
+            cnx.rollback()
+            self.idle.put(cnx)
+        except Exception as e:
+            logger.warning(f"Discarding broken connection: {e}")
+            try:
+                cnx.close()
+            except Exception:
+                pass
+        finally:
+            self.slots.release()
@@ -0,0 +1,67 @@
+from config import settings
+
+# the column keying each per-client stage, shared by every sink
+CLIENT_KEYS = {
+    "transactions": "clientId",
+    "positions": "clientId",
+    "buyingpowers": "client",
+}
+
+
+def stage(name):
+    return name.split("_")[0]
+
+
+def stage_tables(name):
+    # a stage's sub-tables only get a frame when some client in the run has
+    # rows for them, their stored rows still have to be replaced
+    from transformer.columns import COLUMNS
+
+    return [table for table in COLUMNS if stage(table) == name]
+
+
+class MSSQLSink:
+    def __init__(self) -> None:
+        from database import helper
+
+        self.helper = helper
+
+    def write(self, df_transformed, watermarks=None, replaced=None, checkpoint=None):
+        # fast_to_sql renames the columns in place, which other sinks still read
+        df_transformed = {
+            name: df.copy(deep=False) for name, df in df_transformed.items()
+        }
+        self.helper.insert_data(
+            df_transformed, watermarks, replaced, checkpoint=checkpoint
+        )
+
+    def watermarks(self) -> dict:
+        return self.helper.fetch_watermarks()
+
+
+def parquet_sink():
+    from database.parquet import ParquetSink
+
+    if not settings.PARQUET_DIR:
+        raise RuntimeError("PARQUET_DIR must be set for the parquet sink")
+
+    return ParquetSink(
+        settings.PARQUET_DIR,
+        row_group_size=settings.PARQUET_ROW_GROUP_SIZE,
+        compression=settings.PARQUET_COMPRESSION,
+    )
+
+
+SINKS = {
+    "mssql": MSSQLSink,
+    "parquet": parquet_sink,
+}
+
+
+def init_sinks(names=None) -> list:
+    names = names or settings.SINK
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f"Unknown sinks {unknown}, choose from {list(SINKS)}")
+
+    return [SINKS[name]() for name in names]
@@ -1,24 +1,429 @@
-from config import logger, settings
-from database.helper import insert_data
-from swissquote import App
-from transformer import Agent
+import argparse
+import asyncio
 
+from config import logger, metrics, settings
+
+# Each stage imports its own dependencies (pandas, pyodbc, httpx, ...) when it
+# runs, so fetch-only runs and dry runs do not pay for the others.
+
+
+def require(*names):
+    missing = [name for name in names if not getattr(settings, name)]
+    if missing:
+        raise RuntimeError(f"{', '.join(missing)} must be set for this command")
+
+
+def init_agent(data):
+    from transformer import Agent
+
+    if settings.TRANSFORM_ENGINE == "arrow":
+        from transformer import ColumnarAgent
+
+        return ColumnarAgent(data)
+
+    return Agent(data)
+
+
+def agent_cls():
+    from transformer import Agent
+
+    if settings.TRANSFORM_ENGINE == "arrow":
+        from transformer import ColumnarAgent
+
+        return ColumnarAgent
+
+    return Agent
+
+
+def init_app(watermarks=None, client_filter=None):
+    from swissquote import App, PageHistory, RateLimiter, ResponseCache
 
-def main():
     logger.info("Initializing SwissQuote Client")
-    app = App(
+    cache = ResponseCache(
+        ttls={
+            "staticlists": settings.STATICLISTS_CACHE_TTL,
+            "rates": settings.RATES_CACHE_TTL,
+        },
+        maxsize=settings.RESPONSE_CACHE_SIZE,
+        directory=settings.RESPONSE_CACHE_DIR or None,
+    )
+    limiter = None
+    if settings.REQUEST_RATE_LIMIT:
+        limiter = RateLimiter(
+            settings.REQUEST_RATE_LIMIT,
+            max_rate=settings.REQUEST_RATE_LIMIT_MAX or None,
+            latency_target=settings.REQUEST_LATENCY_TARGET or None,
+        )
+
+    return App(
         token=settings.TOKEN,
         max_retries=settings.REQUEST_MAX_RETRIES,
         backoff_factor=settings.REQUEST_BACKOFF_FACTOR,
+        max_workers=settings.REQUEST_MAX_WORKERS,
+        page_workers=settings.REQUEST_MAX_PAGE_WORKERS,
+        http2=settings.REQUEST_HTTP2,
+        buyingpowers=settings.FETCH_BUYINGPOWERS,
+        watermarks=watermarks,
+        client_filter=client_filter,
+        cache=cache,
+        decoder=settings.REQUEST_JSON_DECODER,
+        limiter=limiter,
+        history=PageHistory(settings.PAGE_HISTORY_PATH or None),
     )
 
-    data = app.fetch()
+
+def init_checkpoint():
+    from database import Checkpoint
+
+    if settings.INSERT_CHECKPOINT_DIR:
+        return Checkpoint(settings.INSERT_CHECKPOINT_DIR)
+
+    return None
+
+
+def init_store():
+    from swissquote import SnapshotStore
+
+    if settings.SNAPSHOT_DIR:
+        return SnapshotStore(settings.SNAPSHOT_DIR)
+
+    return None
+
+
+def init_sinks():
+    from database.sinks import init_sinks
+
+    return init_sinks()
+
+
+def load_watermarks():
+    if not settings.TRANSACTIONS_INCREMENTAL:
+        return None
+
+    # the first sink is the one the watermarks are tracked in
+    logger.info("Loading transaction watermarks")
+    return init_sinks()[0].watermarks()
+
+
+def load(df_transformed, watermarks=None, replaced=None, checkpoint=None):
+    logger.info(f"Loading data into {', '.join(settings.SINK)}")
+    with metrics.timer("stage_seconds", stage="load"):
+        for sink in init_sinks():
+            sink.write(df_transformed, watermarks, replaced, checkpoint=checkpoint)
+    if checkpoint:
+        checkpoint.clear()
+
+
+def fetch(app):
+    with metrics.timer("stage_seconds", stage="fetch"):
+        if settings.REQUEST_ASYNC:
+            data = asyncio.run(app.fetch_async())
+        else:
+            data = app.fetch()
+
+    limiter = app.client.limiter
+    if limiter:
+        logger.info(f"Rate limiter: {limiter.stats()}")
+
+    return data
+
+
+def failed_replaces(data, watermarks=None):
+    # a client that failed to fetch is missing from its stage's data, so the
+    # stage only replaces the rows of the clients that made it instead of the
+    # whole table; incremental transactions already replace by client
+    clientids = [client["clientId"] for client in data["clients"]]
+    stages = ["positions", "buyingpowers"]
+    if watermarks is None:
+        stages.append("transactions")
+
+    replaced = {}
+    for stage in stages:
+        if stage not in data:
+            continue
+
+        fetched = {str(clientid) for clientid in data[stage]}
+        kept = [c for c in clientids if str(c) not in fetched]
+        if kept:
+            logger.warning(f"Keeping the stored {stage} of {len(kept)} clients")
+            replaced[stage] = [c for c in clientids if str(c) in fetched]
+
+    return replaced
+
+
+def transform(data, watermarks=None, checkpoint=None):
+    from pipeline import FingerprintIndex
+
+    index, replaced = None, failed_replaces(data, watermarks) or None
+    if settings.FINGERPRINT_PATH:
+        logger.info("Skipping unchanged client payloads")
+        index = FingerprintIndex(settings.FINGERPRINT_PATH)
+        # failed clients keep their fingerprint, so they are not replaced
+        replaced = {**(replaced or {}), **index.apply(data)}
+
     logger.info("Transforming data")
-    df_transformed = Agent(data).transform()
-    logger.info("Inserting data to database")
-    insert_data(df_transformed)
-    logger.info("Application completed successfully")
+    with metrics.timer("stage_seconds", stage="transform"):
+        df_transformed = init_agent(data).transform()
+    if checkpoint:
+        checkpoint.start(df_transformed, watermarks, replaced)
+
+    return df_transformed, replaced, index
+
+
+def transform_load(data, watermarks=None, checkpoint=None):
+    df_transformed, replaced, index = transform(data, watermarks, checkpoint)
+    load(df_transformed, watermarks, replaced, checkpoint)
+    if index:
+        index.save()
+
+
+def resume_load(checkpoint):
+    from pipeline import FingerprintIndex
+
+    if not checkpoint or not checkpoint.exists():
+        raise RuntimeError("No insert checkpoint to resume from")
+
+    load(*checkpoint.resume(), checkpoint=checkpoint)
+    if settings.FINGERPRINT_PATH:
+        FingerprintIndex.commit_pending(settings.FINGERPRINT_PATH)
+
+
+def run_shard(index, count):
+    from pipeline import Shard
+
+    shard = Shard(index, count, settings.SHARD_DIR)
+    logger.info(f"Running shard {index + 1}/{count}")
+    watermarks = load_watermarks()
+    app = init_app(watermarks, client_filter=shard.owns)
+    data = fetch(app)
+    with metrics.timer("stage_seconds", stage="transform"):
+        df_transformed = init_agent(data).transform()
+
+    df_transformed = shard.save_shared(df_transformed)
+    # incremental transactions are already replaced from their watermark on
+    stages = ["positions"]
+    if watermarks is None:
+        stages.append("transactions")
+
+    if app.buyingpowers:
+        stages.append("buyingpowers")
+
+    replaced = Shard.replaced(app.clients, stages, app.errors)
+
+    load(df_transformed, watermarks, replaced)
+
+
+def coordinate(count):
+    from database.helper import delete_departed_clients
+    from pipeline import Coordinator
+
+    # the tables shared by all shards, once every shard has finished
+    coordinator = Coordinator(count, settings.SHARD_DIR)
+    app = init_app()
+    data = {
+        "clients": app.client.get_managed_clients(),
+        "staticlists": app.client.get_staticlists(),
+    }
+    df_transformed = init_agent(data).transform()
+    securities = coordinator.securities()
+    if not securities.empty:
+        df_transformed["securities"] = securities
+
+    # with incremental transactions the shards only saw part of the
+    # securities, so they are replaced by key instead of as a whole table
+    load(df_transformed, {} if settings.TRANSACTIONS_INCREMENTAL else None)
+    delete_departed_clients([client["clientId"] for client in data["clients"]])
+    coordinator.clear()
+
+
+def run_sharded(processes):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(run_shard, index, processes) for index in range(processes)
+        ]
+        for future in futures:
+            future.result()
+
+    coordinate(processes)
+
+
+def run_full(resume=False, snapshot=None, coordinate_shards=False, dry_run=False):
+    checkpoint = init_checkpoint()
+    if dry_run:
+        init_sinks()
+        init_app()
+        agent_cls()
+        return
+
+    if resume:
+        resume_load(checkpoint)
+        return
+
+    sharded = settings.SHARD_PROCESSES > 1 or settings.SHARD_COUNT > 1
+    if settings.SINK != ["mssql"] and (sharded or settings.STREAM):
+        raise RuntimeError("Sharded and streaming runs only load into mssql")
+
+    if coordinate_shards:
+        coordinate(settings.SHARD_COUNT)
+        return
+
+    if sharded:
+        if settings.SHARD_PROCESSES > 1:
+            run_sharded(settings.SHARD_PROCESSES)
+        else:
+            run_shard(settings.SHARD_INDEX, settings.SHARD_COUNT)
+
+        return
+
+    store = init_store()
+    if snapshot:
+        if not store:
+            raise RuntimeError("SNAPSHOT_DIR is required to load a snapshot")
+
+        data, watermarks = store.load(snapshot)
+        transform_load(data, watermarks, checkpoint)
+        return
+
+    watermarks = load_watermarks()
+    app = init_app(watermarks)
+
+    if settings.STREAM:
+        from pipeline import StreamPipeline
+
+        logger.info("Streaming data to database")
+        StreamPipeline(
+            app,
+            chunk_size=settings.STREAM_CHUNK_SIZE,
+            queue_size=settings.STREAM_QUEUE_SIZE,
+            watermarks=watermarks,
+            agent_cls=agent_cls(),
+        ).run()
+        return
+
+    data = fetch(app)
+    if store:
+        store.save(data, watermarks)
+
+    transform_load(data, watermarks, checkpoint)
+
+
+def run_fetch(dry_run=False):
+    # fetch into a snapshot that a later transform command picks up
+    require("SNAPSHOT_DIR")
+    store = init_store()
+    if dry_run:
+        init_app()
+        return
+
+    watermarks = load_watermarks()
+    data = fetch(init_app(watermarks))
+    run_id = store.save(data, watermarks)
+    logger.info(f"Fetched snapshot {run_id}")
+
+
+def run_transform(run_id="latest", dry_run=False):
+    # transform a snapshot into checkpointed frames for the load command
+    from pipeline import FingerprintIndex
+
+    require("SNAPSHOT_DIR", "INSERT_CHECKPOINT_DIR")
+    store, checkpoint = init_store(), init_checkpoint()
+    if dry_run:
+        agent_cls()
+        return
+
+    data, watermarks = store.load(run_id)
+    _, _, index = transform(data, watermarks, checkpoint)
+    if index:
+        # only becomes the live index once the load went through
+        index.save(FingerprintIndex.pending_path(index.path))
+
+
+def run_load(dry_run=False):
+    require("INSERT_CHECKPOINT_DIR")
+    checkpoint = init_checkpoint()
+    if dry_run:
+        init_sinks()
+        return
+
+    resume_load(checkpoint)
+
+
+COMMANDS = {
+    "full": run_full,
+    "fetch": run_fetch,
+    "transform": run_transform,
+    "load": run_load,
+}
+
+
+def main(command="full", dry_run=False, **kwargs):
+    COMMANDS[command](dry_run=dry_run, **kwargs)
+    if dry_run:
+        logger.info(f"Dry run of {command} completed")
+    else:
+        logger.info("Application completed successfully")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="resolve settings and load the command's dependencies, then exit",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    # the full pipeline also runs without a command, as before
+    full = commands.add_parser("full", help="fetch, transform and load (default)")
+    for command_parser in [parser, full]:
+        command_parser.add_argument(
+            "--resume",
+            action="store_true",
+            default=argparse.SUPPRESS,
+            help="resume the load of a crashed run from INSERT_CHECKPOINT_DIR",
+        )
+        command_parser.add_argument(
+            "--from-snapshot",
+            dest="snapshot",
+            nargs="?",
+            const="latest",
+            default=argparse.SUPPRESS,
+            metavar="RUN_ID",
+            help="transform and load a raw snapshot from SNAPSHOT_DIR",
+        )
+        command_parser.add_argument(
+            "--coordinate",
+            dest="coordinate_shards",
+            action="store_true",
+            default=argparse.SUPPRESS,
+            help="load the tables shared by SHARD_COUNT shards once all of them ran",
+        )
+
+    commands.add_parser("fetch", help="fetch into a snapshot in SNAPSHOT_DIR")
+    transform_parser = commands.add_parser(
+        "transform", help="transform a snapshot into INSERT_CHECKPOINT_DIR"
+    )
+    transform_parser.add_argument("run_id", nargs="?", default="latest")
+    commands.add_parser("load", help="load the frames in INSERT_CHECKPOINT_DIR")
+
+    args = vars(parser.parse_args(argv))
+    args["command"] = args["command"] or "full"
+    full_options = {"resume", "snapshot", "coordinate_shards"} & set(args)
+    if args["command"] != "full" and full_options:
+        parser.error(
+            "--resume, --from-snapshot and --coordinate only apply to the full "
+            f"command, not {args['command']}"
+        )
+
+    return args
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    try:
+        main(**args)
+    finally:
+        if settings.METRICS_PATH:
+            metrics.export(settings.METRICS_PATH, settings.METRICS_FORMAT)
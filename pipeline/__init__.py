@@ -0,0 +1,12 @@
+from pipeline.fingerprint import FingerprintIndex
+from pipeline.shard import Coordinator, Shard
+
+
+def __getattr__(name):
+    # streaming inserts as it goes and pulls in the database layer
+    if name == "StreamPipeline":
+        from pipeline.stream import StreamPipeline
+
+        return StreamPipeline
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+from config import logger
+
+
+class FingerprintIndex:
+    STAGES = ["positions", "buyingpowers"]
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.hashes = json.load(f)
+
+    @staticmethod
+    def digest(payload) -> str:
+        raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def apply(self, data: dict) -> dict:
+        # drop unchanged client payloads from the raw data in place and return,
+        # per stage, the clients whose stored rows have to be replaced
+        clientids = {str(client["clientId"]) for client in data["clients"]}
+        replaced = {}
+        for stage in self.STAGES:
+            if stage not in data:
+                continue
+
+            previous = self.hashes.get(stage, {})
+            current = {
+                key: previous[key] for key in clientids if key in previous
+            }
+            changed, unchanged = [], 0
+            for clientid, payload in list(data[stage].items()):
+                digest = self.digest(payload)
+                current[str(clientid)] = digest
+                if previous.get(str(clientid)) == digest:
+                    del data[stage][clientid]
+                    unchanged += 1
+                else:
+                    changed.append(clientid)
+
+            removed = [key for key in previous if key not in clientids]
+            if stage in self.hashes:
+                replaced[stage] = changed + removed
+
+            self.hashes[stage] = current
+            logger.info(
+                f"{stage}: {len(changed)} changed, {len(removed)} removed, "
+                f"{unchanged} unchanged clients"
+            )
+
+        return replaced
+
+    def save(self, path: str = None) -> None:
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f)
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def pending_path(path: str) -> str:
+        return f"{path}.pending"
+
+    @classmethod
+    def commit_pending(cls, path: str) -> None:
+        # an index saved by a separate transform run, live once its load is done
+        pending = cls.pending_path(path)
+        if os.path.exists(pending):
+            os.replace(pending, path)
@@ -0,0 +1,94 @@
+import os
+import pickle
+import zlib
+from typing import Optional
+
+import pandas as pd
+
+from config import logger
+
+# tables every shard sees a slice of; the coordinator loads them once
+SHARED = ["clients", "staticlists", "securities"]
+
+
+def shard_of(clientid, count: int) -> int:
+    # crc32 rather than hash(), which is salted per interpreter
+    return zlib.crc32(str(clientid).encode("utf-8")) % count
+
+
+class Shard:
+    def __init__(self, index: int, count: int, directory: str) -> None:
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} out of range for {count} shards")
+
+        self.index = index
+        self.count = count
+        self.directory = directory
+        self.path = os.path.join(directory, f"shard-{index}-of-{count}.pkl")
+        os.makedirs(directory, exist_ok=True)
+
+    def owns(self, client: dict) -> bool:
+        return shard_of(client["clientId"], self.count) == self.index
+
+    def save_shared(self, df_transformed: dict) -> dict:
+        # hand the shared tables over to the coordinator, keep the rest
+        shared = {
+            name: df_transformed.pop(name) for name in SHARED if name in df_transformed
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(shared, f)
+
+        os.replace(tmp_path, self.path)
+        return df_transformed
+
+    @staticmethod
+    def replaced(clients: list, stages: list, errors: Optional[dict] = None) -> dict:
+        # every table of a shard only replaces the rows of its own clients, and
+        # keeps those of the clients it failed to fetch (None: the whole stage)
+        errors = errors or {}
+        replaced = {}
+        for stage in stages:
+            failed = errors.get(stage, {})
+            replaced[stage] = [
+                client["clientId"]
+                for client in clients
+                if None not in failed and client["clientId"] not in failed
+            ]
+
+        return replaced
+
+
+class Coordinator:
+    def __init__(self, count: int, directory: str) -> None:
+        self.count = count
+        self.paths = [
+            os.path.join(directory, f"shard-{index}-of-{count}.pkl")
+            for index in range(count)
+        ]
+
+    def securities(self) -> pd.DataFrame:
+        missing = [path for path in self.paths if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"Shards have not finished: {missing}")
+
+        frames = []
+        for path in self.paths:
+            with open(path, "rb") as f:
+                shared = pickle.load(f)
+
+            if "securities" in shared:
+                frames.append(shared["securities"])
+
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames, ignore_index=True)
+        unique = df.drop_duplicates(subset=["securityId"], keep="first")
+        logger.info(f"Merged {len(unique)} securities from {len(frames)} shards")
+        return unique
+
+    def clear(self) -> None:
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,144 @@
+import queue
+import threading
+
+from config import logger
+from database.helper import commit_stages, drop_stages, stage_data
+from database.sinks import CLIENT_KEYS, stage
+from pipeline.shard import Shard
+from transformer import Agent
+
+DONE = object()
+
+
+class StreamPipeline:
+    def __init__(
+        self,
+        app,
+        chunk_size=100000,
+        queue_size=256,
+        watermarks=None,
+        agent_cls=Agent,
+    ):
+        self.app = app
+        self.agent_cls = agent_cls
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.watermarks = watermarks
+        self.stages = {}
+        self.securityids = set()
+        self.error = None
+
+    def run(self) -> None:
+        try:
+            self.stream()
+            self.keep_failed_clients()
+            commit_stages(self.stages)
+        except Exception:
+            logger.error("Streaming failed, the tables are left as they were")
+            drop_stages(self.stages)
+            raise
+
+    def stream(self) -> None:
+        self.app.emit = lambda *item: self.queue.put(item)
+        fetcher = threading.Thread(target=self._fetch)
+        fetcher.start()
+
+        chunk, rows = {}, 0
+        while True:
+            item = self.queue.get()
+            if item is DONE:
+                break
+
+            if self.error:
+                continue
+
+            name, clientid, payload = item
+            chunk.setdefault(name, {})[clientid] = payload
+            rows += self.count_rows(name, payload)
+            if rows >= self.chunk_size:
+                self._safe_flush(chunk)
+                chunk, rows = {}, 0
+
+        fetcher.join()
+        if self.error:
+            raise self.error
+
+        self.flush(chunk)
+        self.flush(
+            {
+                "clients": self.app.data["clients"],
+                "staticlists": self.app.data.get("staticlists"),
+            }
+        )
+
+    def _fetch(self) -> None:
+        try:
+            self.app.fetch()
+        except Exception as e:
+            logger.error(f"Streaming fetch failed. Error: {e}")
+            self.error = e
+        finally:
+            self.queue.put(DONE)
+
+    def _safe_flush(self, chunk) -> None:
+        # keep draining the queue after a failure so blocked fetchers can exit
+        try:
+            self.flush(chunk)
+        except Exception as e:
+            logger.error(f"Streaming flush failed. Error: {e}")
+            self.error = e
+
+    def flush(self, chunk) -> None:
+        if not any(chunk.values()):
+            return
+
+        dfs = self.agent_cls({"clients": [], **chunk}).transform()
+        if "securities" in dfs:
+            dfs["securities"] = self.drop_inserted_securities(dfs["securities"])
+
+        stage_data(
+            {name: df for name, df in dfs.items() if not df.empty},
+            self.stages,
+            self.watermarks,
+        )
+
+        logger.info(f"Flushed chunk with {sum(len(df) for df in dfs.values())} rows")
+
+    def keep_failed_clients(self) -> None:
+        # a stage with failed clients only replaces the rows of the clients
+        # that made it, and the securities by key, as in unstreamed runs
+        failed = False
+        for name, staged in self.stages.items():
+            if stage(name) not in CLIENT_KEYS or staged["delete_where"]:
+                continue
+
+            if not self.app.errors.get(stage(name)):
+                continue
+
+            failed = True
+            clientids = Shard.replaced(self.app.clients, [stage(name)], self.app.errors)
+            staged["delete_where"] = (
+                f"{CLIENT_KEYS[stage(name)]} = ?",
+                [(clientid,) for clientid in clientids[stage(name)]],
+            )
+
+        if failed and "securities" in self.stages:
+            self.stages["securities"]["delete_where"] = (
+                "securityId = ?",
+                [(securityid,) for securityid in self.securityids],
+            )
+
+    def drop_inserted_securities(self, df):
+        df = df[~df["securityId"].isin(self.securityids)]
+        self.securityids.update(df["securityId"].tolist())
+        return df
+
+    @staticmethod
+    def count_rows(name, payload) -> int:
+        if name == "transactions":
+            return sum(len(page["transactions"] or []) for page in payload)
+
+        if name == "positions":
+            return len(payload["positions"] or [])
+
+        return 1
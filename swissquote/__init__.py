@@ -1 +1,5 @@
 from swissquote.app import App
+from swissquote.cache import ResponseCache
+from swissquote.ratelimit import RateLimiter
+from swissquote.schedule import PageHistory
+from swissquote.snapshot import SnapshotStore
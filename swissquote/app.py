@@ -1,26 +1,63 @@
+import asyncio
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 
+from config import logger, metrics
+from swissquote import incremental
 from swissquote.client import SwissQuote
+from swissquote.schedule import PageHistory, PageScheduler
 
 
 class App:
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        max_workers: int = 8,
+        page_workers: int = 4,
+        http2: bool = False,
+        buyingpowers: bool = False,
+        watermarks: Optional[dict] = None,
+        client_filter: Optional[Callable[[dict], bool]] = None,
+        history: Optional[PageHistory] = None,
+        **kwargs,
+    ):
         self.data = {}
         self.clients = []
-        self.client = SwissQuote(*args, **kwargs)
+        self.errors = {}
+        self.watermarks = watermarks or {}
+        self.emit = None
+        self.max_workers = max_workers
+        self.page_workers = page_workers
+        self.http2 = http2
+        self.buyingpowers = buyingpowers
+        self.client_filter = client_filter
+        self.history = history or PageHistory()
+        self.pages = PageScheduler(page_workers, max_workers * page_workers)
+        self.client_args = (args, kwargs)
+        self.client = SwissQuote(
+            *args, pool_maxsize=max_workers * page_workers, **kwargs
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="swissquote"
+        )
 
     def fetch(self) -> dict:
-        self.clients = self.client.get_managed_clients()
+        self.clients = self._filter_clients(self.client.get_managed_clients())
         self.data["clients"] = self.clients
 
+        stages = {
+            "staticlists": self.fetch_staticlists,
+            "positions": self.fetch_clients_positions,
+            "transactions": self.fetch_clients_transactions,
+        }
+        if self.buyingpowers:
+            stages["buyingpowers"] = self.fetch_clients_buyingpowers
+
         threads = []
-        for func in [
-            self.fetch_staticlists,
-            # self.fetch_clients_buyingpowers,
-            self.fetch_clients_positions,
-            self.fetch_clients_transactions,
-        ]:
-            thread = threading.Thread(target=func)
+        for name, func in stages.items():
+            thread = threading.Thread(target=self._run_stage, args=(name, func))
             threads.append(thread)
 
         for t in threads:
@@ -29,46 +66,256 @@ class App:
         for t in threads:
             t.join()
 
+        self.history.save()
         return self.data
 
-    def fetch_clients_transactions(self) -> None:
-        transactions = {}
+    async def fetch_async(self) -> dict:
+        # httpx is only imported for asyncio runs
+        from swissquote.async_client import AsyncSwissQuote
+
+        args, kwargs = self.client_args
+        async with AsyncSwissQuote(
+            *args, max_connections=self.max_workers, http2=self.http2, **kwargs
+        ) as client:
+            self.clients = self._filter_clients(await client.get_managed_clients())
+            self.data["clients"] = self.clients
+
+            stages = {
+                "staticlists": client.get_staticlists(),
+                "positions": self._gather_clients(
+                    "positions",
+                    lambda c: client.get_positions(c["clientId"]),
+                ),
+                "transactions": self._gather_clients(
+                    "transactions",
+                    lambda c: self._fetch_client_transactions_async(
+                        client, c["clientId"]
+                    ),
+                    self.history.order(self.clients),
+                ),
+            }
+            if self.buyingpowers:
+                stages["buyingpowers"] = self._gather_clients(
+                    "buyingpowers",
+                    lambda c: client.get_buyingpower(
+                        c["clientId"], c["referenceCurrency"]
+                    ),
+                )
+
+            # a failed stage leaves the others' data in place, as in fetch
+            results = await asyncio.gather(*stages.values(), return_exceptions=True)
+            for name, result in zip(stages, results):
+                if isinstance(result, Exception):
+                    self._record_error(name, None, result)
+                    continue
+
+                self.data[name] = result
+
+        self.history.save()
+        return self.data
+
+    def _filter_clients(self, clients) -> list:
+        if not self.client_filter:
+            return clients
+
+        return [client for client in clients if self.client_filter(client)]
+
+    def _run_stage(self, name, func) -> None:
+        try:
+            func()
+        except Exception as e:
+            self._record_error(name, None, e)
+
+    def _record_error(self, name, clientid, error) -> None:
+        # a clientid of None stands for the whole stage
+        if clientid is None:
+            logger.error(f"Failed to fetch {name}: {error}")
+        else:
+            logger.error(f"Failed to fetch {name} for client {clientid}: {error}")
+
+        self.errors.setdefault(name, {})[clientid] = str(error)
+
+    def _map_clients(self, name, func, clients=None) -> dict:
+        # clients are dispatched in the given order, results keep self.clients'
+        futures = {
+            client["clientId"]: self.executor.submit(
+                self._run_client, name, func, client
+            )
+            for client in clients or self.clients
+        }
+
+        results = {}
         for client in self.clients:
             clientid = client["clientId"]
-            transactions[clientid] = self._fetch_client_transactions(clientid)
+            future = futures[clientid]
+            try:
+                result = future.result()
+            except Exception as e:
+                self._record_error(name, clientid, e)
+                continue
+
+            if not self.emit:
+                results[clientid] = result
+
+        return results
+
+    def _run_client(self, name, func, client):
+        start = time.perf_counter()
+        result = func(client)
+        self._record_time(name, client["clientId"], start)
+        if not self.emit:
+            return result
+
+        # hand the result over from the worker itself, so a full consumer
+        # queue blocks further fetching instead of piling up results
+        self.emit(name, client["clientId"], result)
+
+    @staticmethod
+    def _record_time(name, clientid, start) -> None:
+        elapsed = time.perf_counter() - start
+        metrics.set("client_fetch_seconds", elapsed, endpoint=name, client=clientid)
+
+    async def _gather_clients(self, name, func, clients=None) -> dict:
+        async def run(client):
+            start = time.perf_counter()
+            result = await func(client)
+            self._record_time(name, client["clientId"], start)
+            return result
 
-        self.data["transactions"] = transactions
+        # clients are started in the given order, results keep self.clients'
+        clients = clients or self.clients
+        responses = await asyncio.gather(
+            *(run(client) for client in clients), return_exceptions=True
+        )
+        responses = {
+            client["clientId"]: resp for client, resp in zip(clients, responses)
+        }
+
+        results = {}
+        for client in self.clients:
+            resp = responses[client["clientId"]]
+            if isinstance(resp, Exception):
+                self._record_error(name, client["clientId"], resp)
+                continue
+
+            results[client["clientId"]] = resp
+
+        return results
+
+    def fetch_clients_transactions(self) -> None:
+        self.data["transactions"] = self._map_clients(
+            "transactions",
+            lambda client: self._fetch_client_transactions(client["clientId"]),
+            self.history.order(self.clients),
+        )
 
     def _fetch_client_transactions(self, clientid) -> list:
-        page = 1
+        with self.pages.client():
+            transactions = self._fetch_client_pages(clientid)
+
+        self.history.record(clientid, len(transactions))
+        return transactions
+
+    def _fetch_client_pages(self, clientid) -> list:
+        resp = self.client.get_transactions(clientid, 1)
+        metrics.set("transaction_pages", resp["totalNumberOfPages"], client=clientid)
+        if not resp["totalNumberOfPages"]:
+            return []
+
+        watermark = self.watermarks.get(str(clientid))
+        if watermark and incremental.newest_first(resp):
+            return self._fetch_client_transactions_since(clientid, resp, watermark)
+
+        pages = range(2, resp["totalNumberOfPages"] + 1)
+        transactions = [
+            resp,
+            *self.pages.map(
+                lambda page: self.client.get_transactions(clientid, page), pages
+            ),
+        ]
+
+        if watermark:
+            return [incremental.trim(page, watermark) for page in transactions]
+
+        return transactions
+
+    def _fetch_client_transactions_since(self, clientid, first, watermark) -> list:
         transactions = []
-        while True:
-            resp = self.client.get_transactions(clientid, page)
-            if not resp["totalNumberOfPages"]:
-                return transactions
+        for page in incremental.newest_first(first):
+            if page == 1:
+                resp = first
+            else:
+                resp = self.client.get_transactions(clientid, page)
 
-            transactions.append(resp)
-            if resp["totalNumberOfPages"] == resp["page"]:
-                return transactions
+            if incremental.is_behind(resp, watermark):
+                break
 
-            page += 1
+            transactions.append(incremental.trim(resp, watermark))
 
-    def fetch_clients_positions(self) -> None:
-        positions = {}
-        for client in self.clients:
-            clientid = client["clientId"]
-            positions[clientid] = self.client.get_positions(clientid)
+        return sorted(transactions, key=lambda resp: resp["page"])
 
-        self.data["positions"] = positions
+    async def _fetch_client_transactions_async(self, client, clientid) -> list:
+        with self.pages.client():
+            transactions = await self._fetch_client_pages_async(client, clientid)
 
-    def fetch_clients_buyingpowers(self) -> None:
-        buyingpowers = {}
-        for client in self.clients:
-            clientid = client["clientId"]
-            currency = client["referenceCurrency"]
-            buyingpowers[clientid] = self.client.get_buyingpower(clientid, currency)
+        self.history.record(clientid, len(transactions))
+        return transactions
 
-        self.data["buyingpowers"] = buyingpowers
+    async def _fetch_client_pages_async(self, client, clientid) -> list:
+        resp = await client.get_transactions(clientid, 1)
+        metrics.set("transaction_pages", resp["totalNumberOfPages"], client=clientid)
+        if not resp["totalNumberOfPages"]:
+            return []
+
+        watermark = self.watermarks.get(str(clientid))
+        if watermark and incremental.newest_first(resp):
+            return await self._fetch_client_transactions_since_async(
+                client, clientid, resp, watermark
+            )
+
+        pages = range(2, resp["totalNumberOfPages"] + 1)
+        transactions = [
+            resp,
+            *await self.pages.map_async(
+                lambda page: client.get_transactions(clientid, page), pages
+            ),
+        ]
+
+        if watermark:
+            return [incremental.trim(page, watermark) for page in transactions]
+
+        return transactions
+
+    async def _fetch_client_transactions_since_async(
+        self, client, clientid, first, watermark
+    ) -> list:
+        transactions = []
+        for page in incremental.newest_first(first):
+            if page == 1:
+                resp = first
+            else:
+                resp = await client.get_transactions(clientid, page)
+
+            if incremental.is_behind(resp, watermark):
+                break
+
+            transactions.append(incremental.trim(resp, watermark))
+
+        return sorted(transactions, key=lambda resp: resp["page"])
+
+    def fetch_clients_positions(self) -> None:
+        self.data["positions"] = self._map_clients(
+            "positions",
+            lambda client: self.client.get_positions(client["clientId"]),
+        )
+
+    def fetch_clients_buyingpowers(self) -> None:
+        self.data["buyingpowers"] = self._map_clients(
+            "buyingpowers",
+            lambda client: self.client.get_buyingpower(
+                client["clientId"], client["referenceCurrency"]
+            ),
+        )
 
     def fetch_staticlists(self):
         self.data["staticlists"] = self.client.get_staticlists()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Optional, Union
+
+import httpx
+
+from config import metrics
+from swissquote import request
+from swissquote.cache import ResponseCache
+from swissquote.decode import get_decoder
+from swissquote.ratelimit import THROTTLE_STATUSES, RateLimiter, retry_after
+
+
+class AsyncSwissQuote:
+
+    BASE_URL = request.BASE_URL
+
+    def __init__(
+        self,
+        token: str,
+        max_retries: int,
+        backoff_factor: float,
+        max_connections: int = 10,
+        http2: bool = False,
+        base_url: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        decoder: str = "json",
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        if base_url:
+            self.BASE_URL = base_url
+
+        self.cache = cache
+        self.loads = get_decoder(decoder)
+        self.limiter = limiter
+
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.req = request.init_async_session(token, max_connections, http2)
+
+    async def __aenter__(self) -> "AsyncSwissQuote":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self.req.aclose()
+
+    async def request(
+        self, url: str, endpoint: Optional[str] = None
+    ) -> Union[list, dict]:
+        entry = None
+        if self.cache and self.cache.caches(endpoint):
+            entry = self.cache.get(url)
+            if entry and self.cache.is_fresh(endpoint, entry):
+                return entry["body"]
+
+        headers = ResponseCache.validators(entry)
+        retry = 0
+        while True:
+            if self.limiter:
+                await self.limiter.acquire_async()
+
+            wait = None
+            try:
+                async with self.semaphore:
+                    start = time.monotonic()
+                    resp = await self.req.get(url, headers=headers)
+            except httpx.TransportError:
+                if retry >= self.max_retries:
+                    raise
+            else:
+                elapsed = time.monotonic() - start
+                metrics.observe("request_seconds", elapsed, endpoint=endpoint)
+                metrics.inc("requests", endpoint=endpoint, status=resp.status_code)
+                metrics.inc("response_bytes", len(resp.content), endpoint=endpoint)
+                if resp.status_code in THROTTLE_STATUSES:
+                    wait = retry_after(resp.headers)
+
+                if self.limiter:
+                    self.limiter.observe(resp.status_code, elapsed, wait)
+
+                if entry and resp.status_code == 304:
+                    self.cache.refresh(url, entry)
+                    return entry["body"]
+
+                if (
+                    resp.status_code not in request.RETRY_STATUSES + [429]
+                    or retry >= self.max_retries
+                ):
+                    resp.raise_for_status()
+                    body = self.loads(resp.content)
+                    if self.cache and self.cache.caches(endpoint):
+                        self.cache.set(url, body, resp.headers)
+
+                    return body
+
+            retry += 1
+            delay = request.backoff_time(self.backoff_factor, retry)
+            if wait is not None:
+                # a shared limiter already holds every request until then
+                delay = 0 if self.limiter else max(delay, wait)
+
+            await asyncio.sleep(delay)
+
+    async def get_managed_clients(self) -> list:
+        url = self.BASE_URL + "clients"
+        return await self.request(url, "clients")
+
+    async def get_positions(self, clientid: Union[int, str]) -> dict:
+        url = self.BASE_URL + f"clients/{clientid}/positions"
+        return await self.request(url, "positions")
+
+    async def get_transactions(
+        self, clientid: Union[int, str], page: Optional[int] = None
+    ) -> dict:
+        url = self.BASE_URL + f"clients/{clientid}/transactions"
+        if page:
+            url = url + f"?page={page}"
+
+        return await self.request(url, "transactions")
+
+    async def get_buyingpower(self, clientid: Union[int, str], currency: str) -> dict:
+        url = self.BASE_URL + f"clients/{clientid}/buyingPower/{currency}"
+        return await self.request(url, "buyingpower")
+
+    async def get_rates(self, date: Optional[str]) -> dict:
+        url = self.BASE_URL + "clients/rates"
+        if date:
+            url = url + f"?date={date}"
+
+        return await self.request(url, "rates")
+
+    async def get_staticlists(self) -> dict:
+        url = self.BASE_URL + "lists/"
+        return await self.request(url, "staticlists")
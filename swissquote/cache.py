@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    def __init__(
+        self, ttls: dict, maxsize: int = 128, directory: Optional[str] = None
+    ) -> None:
+        self.ttls = ttls
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def caches(self, endpoint: Optional[str]) -> bool:
+        return endpoint in self.ttls
+
+    def get(self, url: str) -> Optional[dict]:
+        with self.lock:
+            if url in self.entries:
+                self.entries.move_to_end(url)
+                return self.entries[url]
+
+        entry = self._read(url)
+        if entry:
+            self._remember(url, entry)
+
+        return entry
+
+    def is_fresh(self, endpoint: str, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] < self.ttls[endpoint]
+
+    @staticmethod
+    def validators(entry: Optional[dict]) -> dict:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+    def set(self, url: str, body, headers) -> None:
+        entry = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "body": body,
+        }
+        self._remember(url, entry)
+        self._write(url, entry)
+
+    def refresh(self, url: str, entry: dict) -> None:
+        # the server confirmed the cached body is still current (304)
+        entry = {**entry, "stored_at": time.time()}
+        self._remember(url, entry)
+        self._write(url, entry)
+
+    def _remember(self, url: str, entry: dict) -> None:
+        with self.lock:
+            self.entries[url] = entry
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, url: str) -> Optional[dict]:
+        if not self.directory or not os.path.exists(self._path(url)):
+            return None
+
+        with open(self._path(url), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, url: str, entry: dict) -> None:
+        if not self.directory:
+            return
+
+        # write then rename, so concurrent jobs never read a partial file
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+
+        os.replace(tmp_path, path)
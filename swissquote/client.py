@@ -1,27 +1,104 @@
+import time
 from typing import Optional, Union
 
+from config import metrics
 from swissquote import request
+from swissquote.cache import ResponseCache
+from swissquote.decode import get_decoder
+from swissquote.ratelimit import THROTTLE_STATUSES, RateLimiter, retry_after
 
 
 class SwissQuote:
 
-    BASE_URL = "https://bankingapi.swissquote.ch/am-interface-v2/api/v1/"
+    BASE_URL = request.BASE_URL
 
-    def __init__(self, token: str, max_retries: int, backoff_factor: float) -> None:
-        self.req = request.init_session(token, max_retries, backoff_factor)
+    def __init__(
+        self,
+        token: str,
+        max_retries: int,
+        backoff_factor: float,
+        pool_maxsize: int = 10,
+        base_url: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        decoder: str = "json",
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        if base_url:
+            self.BASE_URL = base_url
+
+        self.cache = cache
+        self.loads = get_decoder(decoder)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        self.req = request.init_session(
+            token,
+            max_retries,
+            backoff_factor,
+            pool_maxsize,
+            self.BASE_URL,
+            status_retries=limiter is None,
+        )
+
+    def request(self, url: str, endpoint: Optional[str] = None) -> Union[list, dict]:
+        entry = None
+        if self.cache and self.cache.caches(endpoint):
+            entry = self.cache.get(url)
+            if entry and self.cache.is_fresh(endpoint, entry):
+                return entry["body"]
+
+        start = time.perf_counter()
+        resp = self.get(url, ResponseCache.validators(entry))
+        metrics.observe(
+            "request_seconds", time.perf_counter() - start, endpoint=endpoint
+        )
+        metrics.inc("requests", endpoint=endpoint, status=resp.status_code)
+        metrics.inc("response_bytes", len(resp.content), endpoint=endpoint)
+        if entry and resp.status_code == 304:
+            self.cache.refresh(url, entry)
+            return entry["body"]
 
-    def request(self, url: str) -> Union[list, dict]:
-        resp = self.req.get(url)
         resp.raise_for_status()
-        return resp.json()
+        body = self.loads(resp.content)
+        if self.cache and self.cache.caches(endpoint):
+            self.cache.set(url, body, resp.headers)
+
+        return body
+
+    def get(self, url: str, headers: dict):
+        if not self.limiter:
+            return self.req.get(url, headers=headers)
+
+        # statuses are retried here instead of inside the session, so every
+        # attempt goes through the limiter, which then waits out Retry-After
+        retry = 0
+        while True:
+            self.limiter.acquire()
+            start = time.monotonic()
+            resp = self.req.get(url, headers=headers)
+            wait = None
+            if resp.status_code in THROTTLE_STATUSES:
+                wait = retry_after(resp.headers)
+
+            self.limiter.observe(resp.status_code, time.monotonic() - start, wait)
+            if (
+                resp.status_code not in request.RETRY_STATUSES + [429]
+                or retry >= self.max_retries
+            ):
+                return resp
+
+            retry += 1
+            if wait is None:
+                time.sleep(request.backoff_time(self.backoff_factor, retry))
 
     def get_managed_clients(self) -> list:
         url = self.BASE_URL + "clients"
-        return self.request(url)
+        return self.request(url, "clients")
 
     def get_positions(self, clientid: Union[int, str]) -> dict:
         url = self.BASE_URL + f"clients/{clientid}/positions"
-        return self.request(url)
+        return self.request(url, "positions")
 
     def get_transactions(
         self, clientid: Union[int, str], page: Optional[int] = None
@@ -30,19 +107,19 @@ class SwissQuote:
         if page:
             url = url + f"?page={page}"
 
-        return self.request(url)
+        return self.request(url, "transactions")
 
     def get_buyingpower(self, clientid: Union[int, str], currency: str) -> dict:
         url = self.BASE_URL + f"clients/{clientid}/buyingPower/{currency}"
-        return self.request(url)
+        return self.request(url, "buyingpower")
 
     def get_rates(self, date: Optional[str]) -> dict:
         url = self.BASE_URL + "clients/rates"
         if date:
             url = url + f"?date={date}"
 
-        return self.request(url)
+        return self.request(url, "rates")
 
     def get_staticlists(self) -> dict:
         url = self.BASE_URL + "lists/"
-        return self.request(url)
+        return self.request(url, "staticlists")
@@ -0,0 +1,29 @@
+import json
+from typing import Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+DECODERS = {"json": json.loads}
+if orjson:
+    DECODERS["orjson"] = orjson.loads
+
+if msgspec:
+    DECODERS["msgspec"] = msgspec.json.Decoder().decode
+
+
+def get_decoder(name: str = "auto") -> Callable[[bytes], object]:
+    if name == "auto":
+        name = next(n for n in ["orjson", "msgspec", "json"] if n in DECODERS)
+
+    if name not in DECODERS:
+        raise ValueError(f"JSON decoder {name} is not installed")
+
+    return DECODERS[name]
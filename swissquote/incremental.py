@@ -0,0 +1,43 @@
+import datetime
+from typing import Optional
+
+
+def operation_date(transaction: dict) -> Optional[datetime.date]:
+    value = transaction.get("operationDate")
+    if not value:
+        return None
+
+    return datetime.date.fromisoformat(value[:10])
+
+
+def newest_first(resp: dict) -> Optional[list]:
+    # page numbers ordered from the newest to the oldest transactions, inferred
+    # from the first page; None when the order cannot be told
+    pages = list(range(1, resp["totalNumberOfPages"] + 1))
+    if len(pages) == 1:
+        return pages
+
+    dates = [d for d in map(operation_date, resp["transactions"]) if d]
+    if len(dates) < 2 or dates[0] == dates[-1]:
+        return None
+
+    if dates[0] > dates[-1]:
+        return pages
+
+    return pages[1:][::-1] + pages[:1]
+
+
+def is_behind(resp: dict, watermark: datetime.date) -> bool:
+    dates = [operation_date(tx) for tx in resp["transactions"]]
+    return bool(dates) and all(d and d < watermark for d in dates)
+
+
+def trim(resp: dict, watermark: datetime.date) -> dict:
+    # the replace from the watermark on never matches the stored undated rows,
+    # so only a full load brings them in
+    transactions = [
+        tx
+        for tx in resp["transactions"]
+        if operation_date(tx) and operation_date(tx) >= watermark
+    ]
+    return {**resp, "transactions": transactions}
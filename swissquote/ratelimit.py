@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import email.utils
+import threading
+import time
+from typing import Optional
+
+THROTTLE_STATUSES = [429, 503]
+
+
+def retry_after(headers) -> Optional[float]:
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+# Token bucket shared by every client, tuned AIMD-style: each success that
+# finds the bucket empty adds `increase` requests/s spread over one second of
+# traffic, while throttling, server errors or latency above `latency_target`
+# cut the rate by `decrease`, at most once per second.
+class RateLimiter:
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        min_rate: float = 1.0,
+        max_rate: Optional[float] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_target: Optional[float] = None,
+    ) -> None:
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.decreased_at = 0.0
+        self.waiting = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # takes a token now, possibly on credit, and returns how long to wait
+        # before using it so concurrent callers are spaced out by the rate
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(delay, self.blocked_until - now)
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            self._wait(1)
+            try:
+                # a Retry-After seen while sleeping holds this request as well
+                while delay > 0:
+                    time.sleep(delay)
+                    delay = self.blocked_until - time.monotonic()
+            finally:
+                self._wait(-1)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            self._wait(1)
+            try:
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = self.blocked_until - time.monotonic()
+            finally:
+                self._wait(-1)
+
+    def observe(
+        self, status: int, latency: float, wait: Optional[float] = None
+    ) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                if wait is not None:
+                    self.blocked_until = max(self.blocked_until, now + wait)
+                    self.tokens = min(self.tokens, 0)
+
+            slow = self.latency_target and latency > self.latency_target
+            if status in THROTTLE_STATUSES or status >= 500 or slow:
+                if now - self.decreased_at >= 1:
+                    self.decreased_at = now
+                    self._set_rate(now, self.rate * self.decrease)
+            elif status < 400 and self.tokens < 1:
+                self._set_rate(now, self.rate + self.increase / self.rate)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "rate": round(self.rate, 2),
+                "queue_depth": self.waiting,
+                "throttled": self.throttled,
+            }
+
+    def _set_rate(self, now: float, rate: float) -> None:
+        self._refill(now)
+        rate = max(self.min_rate, rate)
+        self.rate = min(self.max_rate, rate) if self.max_rate else rate
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def _wait(self, n: int) -> None:
+        with self.lock:
+            self.waiting += n
@@ -1,14 +1,50 @@
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+BASE_URL = "https://bankingapi.swissquote.ch/am-interface-v2/api/v1/"
+RETRY_STATUSES = [500, 502, 503, 504]
 
-def init_session(token, max_retries, backoff_factor):
+
+def init_session(
+    token,
+    max_retries,
+    backoff_factor,
+    pool_maxsize=10,
+    base_url=BASE_URL,
+    status_retries=True,
+):
     session = requests.Session()
     retries = Retry(
         total=max_retries,
         backoff_factor=backoff_factor,
-        status_forcelist=[500, 502, 503, 504],
+        status_forcelist=RETRY_STATUSES if status_retries else None,
     )
     session.headers.update({"Authorization": f"Bearer {token}"})
-    session.mount("https://bankingapi.swissquote.ch", HTTPAdapter(max_retries=retries))
+    session.mount(
+        base_url,
+        HTTPAdapter(max_retries=retries, pool_maxsize=pool_maxsize),
+    )
     return session
+
+
+def init_async_session(token, max_connections=10, http2=False):
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+    return httpx.AsyncClient(
+        headers={"Authorization": f"Bearer {token}"},
+        http2=http2,
+        limits=limits,
+        timeout=None,
+    )
+
+
+def backoff_time(backoff_factor, retry_number):
+    # mirrors urllib3.Retry: no sleep before the first retry, then exponential
+    if retry_number <= 1:
+        return 0
+
+    return min(Retry.DEFAULT_BACKOFF_MAX, backoff_factor * 2 ** (retry_number - 1))
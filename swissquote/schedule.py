@@ -0,0 +1,138 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Optional
+
+from config import logger
+
+
+class PageHistory:
+    # smoothed transaction page counts per client from earlier runs, the cost
+    # estimate that orders the clients longest first
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.pages = {}
+        self.recorded = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.pages = self._read()
+
+    def _read(self) -> dict:
+        # the history only orders the clients, a broken file costs no more
+        # than a run without one
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring page history {self.path}: {e}")
+            return {}
+
+    def order(self, clients: list) -> list:
+        # clients without history might be the largest, so they go first too
+        default = max(self.pages.values(), default=0)
+        return sorted(
+            clients,
+            key=lambda client: self.pages.get(str(client["clientId"]), default),
+            reverse=True,
+        )
+
+    def record(self, clientid, pages: int) -> None:
+        key = str(clientid)
+        with self.lock:
+            previous = self.pages.get(key)
+            if previous is not None:
+                pages = round((previous + pages) / 2, 1)
+
+            self.pages[key] = self.recorded[key] = pages
+
+    def save(self) -> None:
+        if not self.path or not self.recorded:
+            return
+
+        # other shards update the same file, only this run's clients change
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            pages = self._read() if os.path.exists(self.path) else {}
+            pages.update(self.recorded)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(pages, f)
+
+            os.replace(tmp_path, self.path)
+
+
+class PageScheduler:
+    # each client keeps at least page_workers pages in flight, and an even
+    # share of all page slots once fewer clients are left fetching, so the
+    # last large clients take over the capacity the finished ones freed
+    def __init__(self, page_workers: int, slots: int) -> None:
+        self.page_workers = page_workers
+        self.slots = max(slots, page_workers)
+        self.active = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def client(self):
+        with self.lock:
+            self.active += 1
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def limit(self) -> int:
+        with self.lock:
+            return max(self.page_workers, self.slots // max(self.active, 1))
+
+    def map(self, fetch, pages) -> list:
+        results, pending, pages = {}, {}, list(pages)
+        remaining = iter(pages)
+        with ThreadPoolExecutor(max_workers=self.slots) as executor:
+            while True:
+                while len(pending) < self.limit():
+                    page = next(remaining, None)
+                    if page is None:
+                        break
+
+                    pending[executor.submit(fetch, page)] = page
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+
+        return [results[page] for page in pages]
+
+    async def map_async(self, fetch, pages) -> list:
+        results, pending, pages = {}, {}, list(pages)
+        remaining = iter(pages)
+        try:
+            while True:
+                while len(pending) < self.limit():
+                    page = next(remaining, None)
+                    if page is None:
+                        break
+
+                    pending[asyncio.ensure_future(fetch(page))] = page
+
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    results[pending.pop(task)] = task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [results[page] for page in pages]
@@ -0,0 +1,116 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from typing import Optional
+
+from config import logger
+
+
+class SnapshotStore:
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.manifests = os.path.join(root, "runs")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.manifests, exist_ok=True)
+
+    def put(self, payload) -> str:
+        raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        raw = raw.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(raw)
+
+            os.replace(tmp_path, path)
+
+        return digest
+
+    def get(self, digest: str):
+        with gzip.open(self._path(digest), "rb") as f:
+            return json.loads(f.read())
+
+    def save(self, data: dict, watermarks: Optional[dict] = None) -> str:
+        run_id = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+        entries = [self._entry("clients", None, None, data["clients"])]
+        if data.get("staticlists"):
+            entries.append(self._entry("staticlists", None, None, data["staticlists"]))
+
+        for endpoint in ["positions", "buyingpowers"]:
+            for clientid, payload in data.get(endpoint, {}).items():
+                entries.append(self._entry(endpoint, clientid, None, payload))
+
+        for clientid, pages in data.get("transactions", {}).items():
+            # a client without transactions still needs its (empty) entry
+            entries.append(self._entry("transactions", clientid, None, None))
+            for resp in pages:
+                entries.append(
+                    self._entry("transactions", clientid, resp["page"], resp)
+                )
+
+        if watermarks is not None:
+            watermarks = {k: v.isoformat() for k, v in watermarks.items()}
+            entries.append(self._entry("watermarks", None, None, watermarks))
+
+        path = os.path.join(self.manifests, f"{run_id}.jsonl")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+        os.replace(f"{path}.tmp", path)
+        logger.info(f"Saved snapshot {run_id} with {len(entries)} responses")
+        return run_id
+
+    def load(self, run_id: str = "latest") -> tuple:
+        if run_id == "latest":
+            runs = self.runs()
+            if not runs:
+                raise FileNotFoundError(f"No snapshot in {self.root}")
+
+            run_id = runs[-1]
+
+        data, watermarks = {}, None
+        path = os.path.join(self.manifests, f"{run_id}.jsonl")
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                endpoint, clientid = entry["endpoint"], entry["clientId"]
+                payload = self.get(entry["hash"]) if entry["hash"] else None
+                if endpoint == "watermarks":
+                    watermarks = {
+                        k: datetime.date.fromisoformat(v) for k, v in payload.items()
+                    }
+                elif endpoint == "transactions":
+                    pages = data.setdefault(endpoint, {}).setdefault(clientid, [])
+                    if payload:
+                        pages.append(payload)
+                elif clientid is None:
+                    data[endpoint] = payload
+                else:
+                    data.setdefault(endpoint, {})[clientid] = payload
+
+        logger.info(f"Loaded snapshot {run_id}")
+        return data, watermarks
+
+    def runs(self) -> list:
+        return sorted(
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.manifests)
+            if name.endswith(".jsonl")
+        )
+
+    def _entry(self, endpoint, clientid, page, payload) -> dict:
+        digest = self.put(payload) if payload is not None else None
+        return {
+            "endpoint": endpoint,
+            "clientId": clientid,
+            "page": page,
+            "hash": digest,
+        }
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], f"{digest}.json.gz")
@@ -0,0 +1,19 @@
+import os
+
+# the required settings, so that modules reading them at import time load
+for name in [
+    "TOKEN",
+    "STATICLISTS_OUTPUT_TABLE",
+    "TRANSACTIONS_OUTPUT_TABLE",
+    "POSITIONS_OUTPUT_TABLE",
+    "SECURITIES_OUTPUT_TABLE",
+    "BUYINGPOWERS_OUTPUT_TABLE",
+    "CLIENTS_OUTPUT_TABLE",
+    "MSSQL_SERVER",
+    "MSSQL_DATABASE",
+    "MSSQL_USERNAME",
+    "MSSQL_PASSWORD",
+]:
+    os.environ.setdefault(name, "test")
+
+os.environ.setdefault("INSERTER_MAX_RETRIES", "0")
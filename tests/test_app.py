@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from benchmarks.payloads import generate
+from benchmarks.stub import StubServer
+from swissquote import App, PageHistory
+from swissquote.async_client import AsyncSwissQuote
+from swissquote.client import SwissQuote
+
+
+@pytest.fixture(scope="module")
+def stub():
+    with StubServer(generate(clients=5, pages=3, rows=40)) as stub:
+        yield stub
+
+
+def init_app(stub, history=None):
+    return App(
+        token="test",
+        max_retries=0,
+        backoff_factor=0,
+        max_workers=4,
+        page_workers=2,
+        buyingpowers=True,
+        base_url=stub.url,
+        history=history,
+    )
+
+
+def run_fetch(app):
+    return app.fetch()
+
+
+def run_fetch_async(app):
+    return asyncio.run(app.fetch_async())
+
+
+def first_client_last():
+    # transactions are dispatched in another order than self.clients'
+    history = PageHistory()
+    history.pages = {"100001": 1, "100002": 5}
+    return history
+
+
+def test_fetch_async_matches_fetch(stub):
+    data = run_fetch(init_app(stub, first_client_last()))
+    assert set(data) == {
+        "clients",
+        "staticlists",
+        "positions",
+        "transactions",
+        "buyingpowers",
+    }
+    data_async = run_fetch_async(init_app(stub, first_client_last()))
+    assert data_async == data
+    # dict equality ignores the order the clients come in
+    for name in ["positions", "transactions", "buyingpowers"]:
+        assert list(data_async[name]) == list(data[name]), name
+
+
+@pytest.mark.parametrize(
+    "run, client_cls",
+    [(run_fetch, SwissQuote), (run_fetch_async, AsyncSwissQuote)],
+)
+def test_failed_stage_keeps_the_others(stub, monkeypatch, run, client_cls):
+    def get_staticlists(self):
+        raise RuntimeError("staticlists unavailable")
+
+    async def get_staticlists_async(self):
+        get_staticlists(self)
+
+    monkeypatch.setattr(
+        client_cls,
+        "get_staticlists",
+        get_staticlists_async if client_cls is AsyncSwissQuote else get_staticlists,
+    )
+    app = init_app(stub)
+    data = run(app)
+    assert "staticlists" not in data
+    assert app.errors == {"staticlists": {None: "staticlists unavailable"}}
+    assert len(data["positions"]) == len(data["transactions"]) == len(app.clients)
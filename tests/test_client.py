@@ -0,0 +1,22 @@
+from benchmarks.payloads import generate
+from benchmarks.stub import StubServer
+from swissquote import RateLimiter
+from swissquote.client import SwissQuote
+
+
+def test_limiter_sees_every_retried_attempt():
+    limiter = RateLimiter(1000)
+    acquired = []
+    acquire = limiter.acquire
+    limiter.acquire = lambda: acquired.append(acquire())
+
+    data = generate(clients=2, pages=1, rows=5)
+    with StubServer(data, error_rate=0.5, seed=1) as stub:
+        client = SwissQuote(
+            "test", max_retries=20, backoff_factor=0, base_url=stub.url, limiter=limiter
+        )
+        for _ in range(10):
+            assert client.get_managed_clients() == data["clients"]
+
+        assert stub.requests > 10
+        assert len(acquired) == stub.requests
@@ -0,0 +1,75 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmarks.payloads import generate
+from transformer import Agent, ColumnarAgent
+from transformer.columns import COLUMNS
+
+
+@pytest.fixture(scope="module")
+def transformed():
+    data = generate(clients=5, pages=3, rows=40)
+    return Agent(data).transform(), ColumnarAgent(data).transform()
+
+
+def values(series) -> list:
+    return [None if pd.isna(value) else value for value in series.astype(object)]
+
+
+def allowed_dtype(expected, actual, series) -> bool:
+    # ColumnarAgent keeps positions and transactions in pyarrow-backed columns
+    # of the same kind; integer columns with gaps stay integers instead of
+    # becoming float64, and columns that are always empty are null instead of
+    # object
+    if actual == expected:
+        return True
+
+    if not isinstance(actual, pd.ArrowDtype):
+        return False
+
+    arrow = actual.pyarrow_dtype
+    if pa.types.is_integer(arrow):
+        return pd.api.types.is_integer_dtype(expected) or (
+            pd.api.types.is_float_dtype(expected) and series.isna().any()
+        )
+
+    if pa.types.is_floating(arrow):
+        return pd.api.types.is_float_dtype(expected)
+
+    if pa.types.is_string(arrow) or pa.types.is_large_string(arrow):
+        return pd.api.types.is_string_dtype(expected)
+
+    if pa.types.is_null(arrow):
+        return expected == object and series.isna().all()
+
+    return False
+
+
+def test_same_tables_and_columns(transformed):
+    agent, columnar = transformed
+    assert list(agent) == list(columnar)
+    for name in agent:
+        assert list(agent[name].columns) == list(columnar[name].columns), name
+        assert len(agent[name]) == len(columnar[name]), name
+
+
+def test_same_values(transformed):
+    agent, columnar = transformed
+    for name in agent:
+        for column in agent[name].columns:
+            if column == "timestamp_created_utc":
+                continue
+
+            expected, actual = agent[name][column], columnar[name][column]
+            assert allowed_dtype(expected.dtype, actual.dtype, expected), (
+                f"{name}.{column}: {expected.dtype} became {actual.dtype}"
+            )
+            assert values(expected) == values(actual), f"{name}.{column}"
+
+
+def test_buyingpowers_have_declared_columns(transformed):
+    for dfs in transformed:
+        for name in ["buyingpowers", "buyingpowers_accounts"]:
+            columns = list(dfs[name].columns)
+            assert columns == COLUMNS[name] + ["timestamp_created_utc"], name
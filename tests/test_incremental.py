@@ -0,0 +1,19 @@
+import datetime
+
+from swissquote import incremental
+
+
+def test_trim_drops_rows_behind_the_watermark_and_undated_rows():
+    resp = {
+        "page": 1,
+        "transactions": [
+            {"transactionId": 1, "operationDate": "2024-01-31"},
+            {"transactionId": 2, "operationDate": "2024-01-30T00:00:00"},
+            {"transactionId": 3, "operationDate": None},
+            {"transactionId": 4},
+            {"transactionId": 5, "operationDate": "2024-01-29"},
+        ],
+    }
+    trimmed = incremental.trim(resp, datetime.date(2024, 1, 30))
+    assert [tx["transactionId"] for tx in trimmed["transactions"]] == [1, 2]
+    assert trimmed["page"] == 1
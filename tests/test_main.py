@@ -0,0 +1,38 @@
+import pytest
+
+import main
+
+
+def test_parse_args_defaults_to_full():
+    assert main.parse_args([]) == {"dry_run": False, "command": "full"}
+    assert main.parse_args(["--resume"])["resume"] is True
+    assert main.parse_args(["full", "--from-snapshot"])["snapshot"] == "latest"
+    assert main.parse_args(["transform", "run"])["run_id"] == "run"
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--resume", "fetch"],
+        ["--coordinate", "load"],
+        ["--from-snapshot", "20240105T063000123456Z", "transform"],
+    ],
+)
+def test_parse_args_rejects_full_options_for_other_commands(argv):
+    with pytest.raises(SystemExit):
+        main.parse_args(argv)
+
+
+def test_failed_clients_keep_their_rows():
+    data = {
+        "clients": [{"clientId": 1}, {"clientId": 2}],
+        "positions": {1: {}},
+        "transactions": {1: [], 2: []},
+    }
+    assert main.failed_replaces(data) == {"positions": [1]}
+
+
+def test_failed_clients_keep_incremental_transactions():
+    data = {"clients": [{"clientId": 1}, {"clientId": 2}], "transactions": {1: []}}
+    assert main.failed_replaces(data, watermarks={}) == {}
+    assert main.failed_replaces(data) == {"transactions": [1]}
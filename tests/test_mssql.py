@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.identity")
+
+from benchmarks.sqlstub import StubDatabase  # noqa: E402
+
+
+def test_merge_drops_temp_stage():
+    df = pd.DataFrame({"id": [1, 2], "value": ["a", "b"]})
+    # the second merge reuses the pooled connection of the first
+    for _ in range(2):
+        StubDatabase().insert_table(df.copy(), "dbo.t", merge_keys=["id"])
+
+    assert StubDatabase.POOL.idle.queue[-1].temp_tables == set()
+
+
+def merge_statements(**kwargs):
+    for connection in StubDatabase.POOL.idle.queue:
+        connection.executed.clear()
+
+    df = pd.DataFrame({"id": [1, 2], "value": ["a", "b"]})
+    StubDatabase().insert_table(df, "dbo.t", merge_keys=["id"], **kwargs)
+    return [
+        sql
+        for sql in StubDatabase.POOL.idle.queue[-1].executed
+        if sql.startswith(("DELETE", "MERGE"))
+    ]
+
+
+def test_merge_full_refresh_deletes_missing_rows():
+    (merge,) = merge_statements()
+    assert merge.endswith("WHEN NOT MATCHED BY SOURCE THEN DELETE;")
+
+
+def test_merge_deletes_replaced_clients_first():
+    delete, merge = merge_statements(delete_where=("id = ?", [(1,), (3,)]))
+    assert delete == "DELETE FROM dbo.t WHERE id = ?"
+    assert merge.startswith("MERGE dbo.t") and "NOT MATCHED BY SOURCE" not in merge
+
+
+def test_merge_append_keeps_missing_rows():
+    (merge,) = merge_statements(delete_prev_records=False)
+    assert "NOT MATCHED BY SOURCE" not in merge
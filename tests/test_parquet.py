@@ -0,0 +1,26 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from database.parquet import ParquetSink
+
+
+def test_replaced_clients_leave_every_sub_table(tmp_path):
+    sink = ParquetSink(str(tmp_path))
+    sink.write(
+        {
+            "buyingpowers": pd.DataFrame({"client": [1, 2], "buyingPower": [1.0, 2.0]}),
+            "buyingpowers_accounts": pd.DataFrame(
+                {"client": [1, 2], "accountNumber": ["1.00", "2.00"]}
+            ),
+        }
+    )
+    # client 1 no longer has accounts, so this run has no frame for them
+    sink.write(
+        {"buyingpowers": pd.DataFrame({"client": [1], "buyingPower": [3.0]})},
+        replaced={"buyingpowers": [1]},
+    )
+
+    accounts = pq.read_table(sink.path("buyingpowers_accounts"))
+    assert accounts["client"].to_pylist() == [2]
+    buyingpowers = pq.read_table(sink.path("buyingpowers"))
+    assert sorted(buyingpowers["client"].to_pylist()) == [1, 2]
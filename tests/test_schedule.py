@@ -0,0 +1,30 @@
+from multiprocessing import get_context
+
+from swissquote.schedule import PageHistory
+
+
+def save_history(path, shard):
+    history = PageHistory(path)
+    for clientid in range(shard * 300, (shard + 1) * 300):
+        history.record(clientid, 1)
+
+    history.save()
+
+
+def test_shards_save_one_history(tmp_path):
+    path = str(tmp_path / "history.json")
+    with get_context("fork").Pool(4) as pool:
+        pool.starmap(save_history, [(path, shard) for shard in range(4)])
+
+    assert len(PageHistory(path).pages) == 1200
+
+
+def test_unreadable_history_is_ignored(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text('{"1": ')
+    history = PageHistory(str(path))
+    assert history.pages == {}
+
+    history.record(1, 3)
+    history.save()
+    assert PageHistory(str(path)).pages == {"1": 3}
@@ -0,0 +1,15 @@
+from pipeline import Shard
+
+CLIENTS = [{"clientId": 1}, {"clientId": 2}, {"clientId": 3}]
+
+
+def test_replaced_keeps_failed_clients():
+    errors = {"positions": {2: "timeout"}, "buyingpowers": {None: "unavailable"}}
+    replaced = Shard.replaced(
+        CLIENTS, ["positions", "transactions", "buyingpowers"], errors
+    )
+    assert replaced == {
+        "positions": [1, 3],
+        "transactions": [1, 2, 3],
+        "buyingpowers": [],
+    }
@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.identity")
+
+from benchmarks.payloads import generate  # noqa: E402
+from benchmarks.sqlstub import StubDatabase  # noqa: E402
+from benchmarks.stub import StubServer  # noqa: E402
+from database import helper  # noqa: E402
+from pipeline import StreamPipeline  # noqa: E402
+from swissquote import App  # noqa: E402
+
+
+def test_failed_stream_leaves_the_tables(monkeypatch):
+    loaded = []
+
+    def load_chunk(self, df, table_name, custom, label):
+        loaded.append(table_name)
+        if len(loaded) == 3:
+            raise RuntimeError("chunk failed")
+
+    monkeypatch.setattr(helper, "init_db_instance", StubDatabase)
+    monkeypatch.setattr(StubDatabase, "load_chunk", load_chunk)
+    for connection in StubDatabase.POOL.idle.queue:
+        connection.executed.clear()
+
+    with StubServer(generate(clients=6, pages=2, rows=20)) as stub:
+        app = App(token="test", max_retries=0, backoff_factor=0, base_url=stub.url)
+        with pytest.raises(RuntimeError, match="chunk failed"):
+            StreamPipeline(app, chunk_size=50).run()
+
+    executed = [sql for c in StubDatabase.POOL.idle.queue for sql in c.executed]
+    assert not [sql for sql in executed if sql.startswith(("DELETE", "INSERT"))]
+    dropped = {sql.split()[-1] for sql in executed if sql.startswith("DROP TABLE")}
+    assert dropped == set(loaded)
+
+
+def test_stream_swaps_the_staging_tables_in(monkeypatch):
+    monkeypatch.setattr(helper, "init_db_instance", StubDatabase)
+    monkeypatch.setattr(StubDatabase, "load_chunk", lambda self, *args: None)
+    for connection in StubDatabase.POOL.idle.queue:
+        connection.executed.clear()
+
+    with StubServer(generate(clients=6, pages=2, rows=20)) as stub:
+        app = App(token="test", max_retries=0, backoff_factor=0, base_url=stub.url)
+        pipeline = StreamPipeline(app, chunk_size=50)
+        pipeline.run()
+
+    executed = [sql for c in StubDatabase.POOL.idle.queue for sql in c.executed]
+    for name, staged in pipeline.stages.items():
+        table = helper.table_name(name)
+        assert f"INSERT INTO {table} SELECT * FROM {staged['stage']}" in executed
+        assert f"DROP TABLE {staged['stage']}" in executed
+
+
+def test_stream_keeps_the_rows_of_failed_clients(monkeypatch):
+    monkeypatch.setattr(helper, "init_db_instance", StubDatabase)
+    monkeypatch.setattr(StubDatabase, "load_chunk", lambda self, *args: None)
+    data = generate(clients=3, pages=1, rows=20)
+    del data["positions"][100002]
+    with StubServer(data) as stub:
+        app = App(token="test", max_retries=0, backoff_factor=0, base_url=stub.url)
+        pipeline = StreamPipeline(app, chunk_size=50)
+        pipeline.run()
+
+    assert pipeline.stages["positions"]["delete_where"] == (
+        "clientId = ?",
+        [(100001,), (100003,)],
+    )
+    assert pipeline.stages["transactions"]["delete_where"] is None
+    assert pipeline.stages["securities"]["delete_where"][0] == "securityId = ?"
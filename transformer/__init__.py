@@ -1 +1,11 @@
 from transformer.agent import Agent
+
+
+def __getattr__(name):
+    # pyarrow is only needed by the arrow transform engine
+    if name == "ColumnarAgent":
+        from transformer.columnar import ColumnarAgent
+
+        return ColumnarAgent
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,26 +1,33 @@
 import datetime
+import time
 
+import numpy as np
 import pandas as pd
 
-from config import logger
-from transformer.columns import COLUMNS
+from config import logger, metrics
+from transformer.columns import COLUMNS, DATE_FORMATS
+from transformer.records import RECORDS, flatten_costs, parse
 
 
 class Agent:
     def __init__(self, data: dict) -> None:
         self.dfs = {}
         self.raw_data = data
-        self.data = {"securities": []}
+        self.data = {"securities": {}}
+        self.duplicate_securities = 0
         self.clients = data["clients"]
 
     def transform(self) -> pd.DataFrame:
         logger.info("Starting data transformation.")
         try:
-            self.transform_staticlists()
-            self.transform_transactions()
-            self.transform_positions()
-            self.transform_buyingpowers()
-            self.init_dfs()
+            for step in [
+                self.transform_staticlists,
+                self.transform_transactions,
+                self.transform_positions,
+                self.transform_buyingpowers,
+                self.init_dfs,
+            ]:
+                self._run_step(step)
         except Exception as e:
             logger.error(f"Data transformation failed. Error: {e}")
             raise
@@ -29,6 +36,37 @@ class Agent:
         logger.debug(f"\n{self.dfs}")
         return self.dfs
 
+    def _run_step(self, step):
+        start = time.perf_counter()
+        step()
+        elapsed = time.perf_counter() - start
+
+        name = step.__name__.replace("transform_", "")
+        rows = self._count_rows(name)
+        metrics.set("transform_seconds", elapsed, step=name)
+        metrics.set("transform_rows", rows, step=name)
+        if elapsed and rows:
+            metrics.set("transform_rows_per_second", rows / elapsed, step=name)
+
+        logger.debug(f"Transformed {rows} {name} rows in {elapsed:.2f}s")
+
+    def _count_rows(self, name):
+        if name == "init_dfs":
+            return sum(len(df) for df in self.dfs.values())
+
+        data = self.data.get(name)
+        if name == "buyingpowers":
+            if not data:
+                return 0
+
+            sub_rows = sum(len(rows) for rows in data["parsed_list"].values())
+            return len(data["parsed_dict"]) + sub_rows
+
+        if isinstance(data, dict):
+            return len(data.get("clientId", []))
+
+        return len(data or [])
+
     def init_dfs(self):
         self._init_dfs()
         self._init_client_df()
@@ -42,12 +80,24 @@ class Agent:
             if not data:
                 continue
 
-            self.dfs[name] = pd.DataFrame(data)
-            self.dfs[name] = self.convert_date(self.dfs[name])
             if name == "securities":
-                self.dfs[name].drop_duplicates(inplace=True)
+                data = list(data.values())
+                logger.info(
+                    f"Collapsed {self.duplicate_securities} duplicate securities "
+                    f"into {len(data)}"
+                )
+                metrics.set("duplicate_securities", self.duplicate_securities)
+
+            if name in RECORDS:
+                self.dfs[name] = pd.DataFrame.from_records(
+                    data, columns=RECORDS[name]._fields
+                )
+            else:
+                self.dfs[name] = pd.DataFrame(data)
+
+            self.dfs[name] = self.convert_date(self.dfs[name], name)
 
-            if name in COLUMNS:
+            if name in COLUMNS and name not in RECORDS:
                 self.dfs[name] = self.dfs[name].reindex(columns=COLUMNS[name])
 
             self.add_timestamp(self.dfs[name])
@@ -60,7 +110,7 @@ class Agent:
         self.dfs["clients"] = self.dfs["clients"].drop(
             columns=["positions", "transactions", "buyingPower"]
         )
-        self.dfs["clients"] = self._convert_date(self.dfs["clients"], "contractStart")
+        self.dfs["clients"] = self.convert_date(self.dfs["clients"], "clients")
         self.dfs["clients"] = self.dfs["clients"][COLUMNS["clients"]]
         self.add_timestamp(self.dfs["clients"])
 
@@ -68,29 +118,22 @@ class Agent:
         if "buyingpowers" not in self.data:
             return
 
-        base_df = pd.DataFrame(self.data["buyingpowers"]["parsed_dict"])
-        sub_dfs = self._init_buyingpowers_sub_dfs()
-        self.dfs["buyingpowers"] = self._merge_buyingpowers_dfs(base_df, sub_dfs)
-        self.add_timestamp(self.dfs["buyingpowers"])
-
-    def _init_buyingpowers_sub_dfs(self):
-        dfs = {}
+        # one row per client, plus a long table per sub-list keyed on client
+        tables = {"buyingpowers": self.data["buyingpowers"]["parsed_dict"]}
         for k, v in self.data["buyingpowers"]["parsed_list"].items():
-            if k in ["clientMargins", "prenotes", "fxPnlDetails"]:
-                continue
+            tables[f"buyingpowers_{k}"] = v
 
-            dfs[k] = pd.DataFrame(v)
-            dfs[k] = dfs[k].add_prefix(f"{k}_")
-            dfs[k] = dfs[k].rename(columns={f"{k}_client": "client"})
-
-        return dfs
+        for name, rows in tables.items():
+            if not rows:
+                continue
 
-    def _merge_buyingpowers_dfs(self, base_df, sub_dfs):
-        merged_df = base_df.copy()
-        for sub_df in sub_dfs.values():
-            merged_df = pd.merge(merged_df, sub_df, how="inner", on="client")
+            # inserts go by column position, so a table needs a fixed schema
+            if name not in COLUMNS:
+                logger.warning(f"Skipping {name}, its columns are not declared")
+                continue
 
-        return merged_df
+            self.dfs[name] = pd.DataFrame(rows).reindex(columns=COLUMNS[name])
+            self.add_timestamp(self.dfs[name])
 
     def _rename_statlists_stockexchange(self, v):
         rows = [
@@ -148,11 +191,25 @@ class Agent:
                     clientid, txblock["transactions"]
                 )
                 self.data["transactions"].extend(txs)
-                self.data["securities"].extend(txblock["securities"])
+                self.add_securities(txblock["securities"])
 
     def _transform_client_transactions(self, clientid, transactions):
-        txs = [{"clientId": clientid, **tx} for tx in transactions]
-        return txs
+        return parse("transactions", clientid, transactions)
+
+    def add_securities(self, securities):
+        # the first occurrence of a security wins, later ones only fill in
+        # fields it is missing
+        for security in securities:
+            key = security.get("securityId")
+            known = self.data["securities"].get(key)
+            if known is None:
+                self.data["securities"][key] = dict(security)
+                continue
+
+            self.duplicate_securities += 1
+            for k, v in security.items():
+                if v is not None and known.get(k) is None:
+                    known[k] = v
 
     def transform_positions(self):
         if "positions" not in self.raw_data or not self.raw_data["positions"]:
@@ -165,20 +222,10 @@ class Agent:
 
             positions = self._transform_client_positions(clientid, data["positions"])
             self.data["positions"].extend(positions)
-            self.data["securities"].extend(data["securities"])
+            self.add_securities(data["securities"])
 
     def _transform_client_positions(self, clientid, positions):
-        psn = []
-        for position in positions:
-            _position = {"clientId": clientid, **position}
-            if "averageBuyCosts" in _position:
-                for curr, price in _position["averageBuyCosts"].items():
-                    _position[f"averageBuyCosts_{curr}"] = price
-
-                del _position["averageBuyCosts"]
-            psn.append(_position)
-
-        return psn
+        return parse("positions", clientid, [flatten_costs(p) for p in positions])
 
     def transform_buyingpowers(self):
         if "buyingpowers" not in self.raw_data or not self.raw_data["buyingpowers"]:
@@ -190,8 +237,10 @@ class Agent:
 
     def transform_dict_buyingpowers(self):
         bps = []
-        for data in self.raw_data["buyingpowers"].values():
-            bps.append(self._transform_dict_buyingpower_item(data))
+        for clientid, data in self.raw_data["buyingpowers"].items():
+            bps.append(
+                {"client": clientid, **self._transform_dict_buyingpower_item(data)}
+            )
 
         return bps
 
@@ -228,22 +277,42 @@ class Agent:
             if not isinstance(v, list):
                 continue
 
-            bps[k] = [{"client": clientid, **_r} for _r in v]
+            bps[k] = [
+                {"client": clientid, **self._transform_dict_buyingpower_item(_r)}
+                for _r in v
+            ]
 
         return bps
 
-    def convert_date(self, df, col=None):
-        for col in df.columns:
-            if "date" in col.lower() or "time" in col.lower():
-                self._convert_date(df, col)
+    def convert_date(self, df, name):
+        for col, date_format in DATE_FORMATS.get(name, {}).items():
+            if col in df.columns:
+                df[col] = self.parse_dates(df[col], date_format)
 
         return df
 
     @staticmethod
-    def _convert_date(df, col):
-        df[col] = pd.to_datetime(df[col], utc=True, errors="coerce")
-        df[col] = df[col].dt.tz_localize(None)
-        return df
+    def parse_dates(series, date_format):
+        # parse each distinct value once with the declared format and only fall
+        # back to format inference for the values that do not match it
+        codes, uniques = pd.factorize(series)
+        uniques = pd.Series(uniques, dtype=object)
+        parsed = pd.to_datetime(
+            uniques, format=date_format, utc=True, errors="coerce"
+        )
+        failed = parsed.isna() & uniques.notna()
+        if failed.any():
+            logger.debug(
+                f"{failed.sum()} {series.name} values do not match {date_format}"
+            )
+            parsed[failed] = pd.to_datetime(
+                uniques[failed], utc=True, errors="coerce"
+            )
+
+        # missing values are coded -1, which picks the trailing NaT
+        parsed = parsed.dt.tz_localize(None).to_numpy()
+        values = np.append(parsed, np.datetime64("NaT"))[codes]
+        return pd.Series(values, index=series.index, name=series.name)
 
     @staticmethod
     def add_timestamp(dataframe) -> None:
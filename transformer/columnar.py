@@ -0,0 +1,82 @@
+import pandas as pd
+import pyarrow as pa
+
+from config import logger
+from transformer.agent import Agent
+from transformer.columns import COLUMNS
+
+
+class ColumnarAgent(Agent):
+    COLUMNAR = ["transactions", "positions"]
+
+    def transform_transactions(self):
+        if "transactions" not in self.raw_data or not self.raw_data["transactions"]:
+            return
+
+        columns = self._init_columns("transactions")
+        for clientid, data in self.raw_data["transactions"].items():
+            for txblock in data:
+                if not txblock["transactions"]:
+                    continue
+
+                self._extend_columns(columns, clientid, txblock["transactions"])
+                self.add_securities(txblock["securities"])
+
+        self.data["transactions"] = columns
+
+    def transform_positions(self):
+        if "positions" not in self.raw_data or not self.raw_data["positions"]:
+            return
+
+        columns = self._init_columns("positions")
+        for clientid, data in self.raw_data["positions"].items():
+            if not data["positions"]:
+                continue
+
+            self._extend_columns(columns, clientid, data["positions"])
+            self.add_securities(data["securities"])
+
+        self.data["positions"] = columns
+
+    @staticmethod
+    def _init_columns(name):
+        return {column: [] for column in COLUMNS[name]}
+
+    @staticmethod
+    def _extend_columns(columns, clientid, rows):
+        for column, values in columns.items():
+            if column == "clientId":
+                values.extend([clientid] * len(rows))
+            elif column.startswith("averageBuyCosts_"):
+                currency = column[len("averageBuyCosts_") :]  # noqa: E203
+                values.extend(
+                    [(row.get("averageBuyCosts") or {}).get(currency) for row in rows]
+                )
+            else:
+                values.extend([row.get(column) for row in rows])
+
+    def _init_dfs(self):
+        columnar = {
+            name: self.data.pop(name) for name in self.COLUMNAR if name in self.data
+        }
+        super()._init_dfs()
+        self.data.update(columnar)
+
+        for name, columns in columnar.items():
+            if not columns["clientId"]:
+                continue
+
+            self.dfs[name] = self.convert_date(self.to_arrow_frame(columns), name)
+            self.add_timestamp(self.dfs[name])
+
+    @staticmethod
+    def to_arrow_frame(columns) -> pd.DataFrame:
+        arrays = {}
+        for column, values in columns.items():
+            try:
+                arrays[column] = pd.arrays.ArrowExtensionArray(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                logger.debug(f"Falling back to object column for {column}: {e}")
+                arrays[column] = pd.array(values, dtype=object)
+
+        return pd.DataFrame(arrays)
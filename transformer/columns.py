@@ -110,4 +110,38 @@ COLUMNS = {
         "description",
         "country",
     ],
+    "buyingpowers": [
+        "client",
+        "currency",
+        "buyingPower",
+        "cash_amount",
+        "cash_currency",
+        "collateral_amount",
+        "collateral_currency",
+    ],
+    "buyingpowers_accounts": [
+        "client",
+        "accountNumber",
+        "balance",
+    ],
+}
+
+DATE_FORMATS = {
+    "transactions": {
+        "operationDate": "%Y-%m-%d",
+        "valueDate": "%Y-%m-%d",
+        "dateTransaction": "ISO8601",
+    },
+    "securities": {
+        "maturityDate": "%Y-%m-%d",
+        "expirationDate": "%Y-%m-%d",
+    },
+    "clients": {
+        "contractStart": "%Y-%m-%d",
+    },
+    "positions": {
+        "evaluationDate": "ISO8601",
+        "startDate": "%Y-%m-%d",
+        "endDate": "%Y-%m-%d",
+    },
 }
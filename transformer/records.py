@@ -0,0 +1,27 @@
+from collections import namedtuple
+
+from transformer.columns import COLUMNS
+
+# the high-volume entities are parsed straight into tuples with the output
+# columns as fields, so fields the tables do not keep are never copied
+RECORDS = {
+    name: namedtuple(f"{name.capitalize()}Record", COLUMNS[name])
+    for name in ["transactions", "positions"]
+}
+
+
+def flatten_costs(position: dict) -> dict:
+    costs = position.get("averageBuyCosts")
+    if not costs:
+        return position
+
+    return {
+        **position,
+        **{f"averageBuyCosts_{curr}": price for curr, price in costs.items()},
+    }
+
+
+def parse(name: str, clientid, rows: list) -> list:
+    # every field but the leading clientId, which is not part of the payload
+    make, fields = RECORDS[name]._make, RECORDS[name]._fields[1:]
+    return [make((clientid, *map(row.get, fields))) for row in rows]